@@ -0,0 +1,339 @@
+"""
+Benchmarks the LLM annotation pipeline against the local mock server.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_autofill --rows 1000 10000 --concurrency 32
+
+Each scenario reports rows/sec, p50/p99 request latency, its own peak RSS and the
+time spent writing the table backup. Results are written as JSON so runs
+can be compared with --compare.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+SCENARIOS = ["batch", "autofill", "autofill_all", "autofill_json"]
+WORDS = (
+    "kunde abonnement faktura mobil bredbånd tv ruter signal dekning pris tilbud "
+    "oppsigelse bestilling feil hjelp takk hei samtale nummer betaling kontrakt"
+).split()
+
+BENCH_CODEBOOK = {
+    "created_at": "01/01/2025 00:00:00",
+    "dataset": "benchmark",
+    "codes": [
+        {
+            "attribute": "Sentiment",
+            "description": "The sentiment of the conversation.",
+            "type": "categorical",
+            "instruction": "Categories:\n\n<<categories>>\n\nAnswer with the category name only:\n\n<<text>>",
+            "categories": [
+                {"category": "Positiv", "description": "Positive tone.", "icon": "🥰"},
+                {"category": "Neutral", "description": "Neutral tone.", "icon": "😐"},
+                {"category": "Negativ", "description": "Negative tone.", "icon": "😡"}
+            ]
+        },
+        {
+            "attribute": "Intent",
+            "description": "The purpose of the call.",
+            "type": "categorical",
+            "instruction": "Categories:\n\n<<categories>>\n\nAnswer with the category name only:\n\n<<text>>",
+            "categories": [
+                {"category": "Klage", "description": "Complaint.", "icon": "😤"},
+                {"category": "Informasjon", "description": "Information request.", "icon": "ℹ️"},
+                {"category": "Bestilling", "description": "Order.", "icon": "🛒"}
+            ]
+        },
+        {
+            "attribute": "txt_Call_Summary",
+            "description": "A brief summary of the call.",
+            "type": "freetext",
+            "instruction": "Summarise the conversation in one sentence:\n\n<<text>>",
+            "categories": []
+        }
+    ]
+}
+
+
+def synthetic_sheet(rows, words_per_text=120, seed=1337):
+    import pandas as pd
+    rng = random.Random(seed)
+    texts = [" ".join(rng.choices(WORDS, k=words_per_text)) + f" #{i}" for i in range(rows)]
+    df = pd.DataFrame()
+    df['ID'] = range(1, rows + 1)
+    df['text'] = texts
+    df['is_reviewed'] = False
+    return df
+
+
+def peak_rss_mb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def current_rss_mb():
+    """Returns the resident set size right now, or None where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class RssSampler:
+    """
+    Samples the resident set size in a background thread, so each scenario reports
+    its own peak. ru_maxrss only gives the peak of the whole process, which after
+    the first large scenario hides every later one. Without /proc (e.g. macOS)
+    the process peak is reported instead.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        if self.peak is not None:
+            self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._sample()
+        else:
+            self.peak = peak_rss_mb()
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def instrument_requests(lm, latencies):
+    """Wraps the backend request functions so each request's latency is recorded"""
+    def timed(fn):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                latencies.append(time.perf_counter() - started)
+        return wrapper
+    lm._request_transcript = timed(lm._request_transcript)
+    lm._request_json = timed(lm._request_json)
+    lm._request_choice = timed(lm._request_choice)
+
+
+def configure_backend(lm, framework, root_url, args):
+    lm.update_llm_config(
+        framework=framework,
+        base_url=f"{root_url}/v1/",
+        model="mock-model",
+        max_concurrency=args.concurrency,
+        max_retries=args.max_retries,
+        requests_per_minute=0,
+        tokens_per_minute=0
+    )
+    lm.config.token_url = f"{root_url}/token"
+    lm.config.genai_api_base_url = root_url
+    lm.config.api_client_id = "bench"
+    lm.config.api_client_secret = "bench"
+    if framework == "OpenAI":
+        # _openai_client always targets api.openai.com for OpenAI; point it at the mock instead
+        lm.config.framework = "OpenAI"
+        lm._openai_client = lambda: lm.clients.openai_client("OpenAI", f"{root_url}/v1/", lm.config.api_key)
+
+
+def run_scenario(scenario, rows, framework, args, lm, mock_settings, latencies):
+    from fannotate.annotator import TranscriptionAnnotator
+    from fannotate.ui.tabs.autofill_handlers import (
+        autofill_from_codebook,
+        autofill_all_attributes,
+        create_prompt_from_json
+    )
+
+    annotator = TranscriptionAnnotator()
+    with open(annotator.codebook_path, 'w') as f:
+        json.dump(BENCH_CODEBOOK, f, indent=4)
+    annotator.df = synthetic_sheet(rows)
+    annotator.selected_column = 'text'
+    annotator.backup_path = annotator.upload_dir / f"annotations_bench_{scenario}_{rows}.parquet"
+
+    sentiment = BENCH_CODEBOOK["codes"][0]
+    instruction = create_prompt_from_json(sentiment)
+    values = [cat["category"] for cat in sentiment["categories"]]
+
+    del latencies[:]
+    requests_before, errors_before = mock_settings.requests, mock_settings.errors
+    progress = lm.BatchProgress()
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        if scenario == "batch":
+            _, status = lm.batch_process_transcripts(
+                annotator.df, instruction, 'text', 'autofill_Sentiment', values, resume=False, progress=progress
+            )
+        elif scenario == "autofill":
+            status = autofill_from_codebook(annotator, "Sentiment", instruction, resume=False, progress=progress)
+        elif scenario == "autofill_all":
+            status = autofill_all_attributes(annotator, resume=False, progress=progress, mode="per_attribute")
+        else:
+            status = autofill_all_attributes(annotator, resume=False, progress=progress, mode="json")
+        elapsed = time.perf_counter() - started
+
+        # Time one more backup on its own, as the handlers also write one at the end
+        backup_started = time.perf_counter()
+        annotator.backup_df()
+        backup_seconds = time.perf_counter() - backup_started
+
+    hits, misses = progress.cache_stats()
+    return {
+        "scenario": scenario,
+        "framework": framework,
+        "rows": rows,
+        "concurrency": args.concurrency,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed, 2) if elapsed > 0 else None,
+        "requests": progress.done + progress.errors,
+        "requests_per_sec": round((progress.done + progress.errors) / elapsed, 2) if elapsed > 0 else None,
+        "failed_requests": progress.errors,
+        "server_requests": mock_settings.requests - requests_before,
+        "server_errors": mock_settings.errors - errors_before,
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "latency_p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        "cache_hits": hits,
+        "cache_misses": misses,
+        "backup_seconds": round(backup_seconds, 3),
+        "peak_rss_mb": round(rss.peak, 1),
+        "status": status.splitlines()[0] if status else ""
+    }
+
+
+def compare(results, baseline_path, threshold):
+    """Prints throughput changes against a baseline file; returns True if any scenario regressed"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r["scenario"], r["framework"], r["rows"]): r for r in baseline.get("results", [])}
+    regressed = False
+    for result in results:
+        old = previous.get((result["scenario"], result["framework"], result["rows"]))
+        if not old or not old.get("rows_per_sec") or not result.get("rows_per_sec"):
+            continue
+        change = (result["rows_per_sec"] - old["rows_per_sec"]) / old["rows_per_sec"]
+        flag = ""
+        if change < -threshold:
+            flag = "  <-- REGRESSION"
+            regressed = True
+        print(f"{result['scenario']:>14} {result['framework']:>12} {result['rows']:>7} rows: "
+              f"{old['rows_per_sec']:>9.1f} -> {result['rows_per_sec']:>9.1f} rows/s ({change:+.1%}){flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Fannotate LLM annotation pipeline")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=["batch", "autofill"])
+    parser.add_argument("--frameworks", nargs="+", choices=["vLLM", "OpenAI", "TN-GenAI-V1"], default=["vLLM"])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--max-retries", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="Mean mock latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Uniform +/- jitter in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--cache", action="store_true", help="Keep the LLM response cache enabled")
+    parser.add_argument("--output", default=None, help="Result JSON path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="Baseline result JSON to compare throughput against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown reported as regression")
+    args = parser.parse_args()
+
+    output = Path(args.output) if args.output else (
+        REPO_ROOT / "benchmarks" / "results" / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    output = output.resolve()
+
+    # Keep uploads/ and the response cache of the benchmark away from the real ones
+    workdir = tempfile.mkdtemp(prefix="fannotate_bench_")
+    os.chdir(workdir)
+
+    from benchmarks.mock_server import start_mock_server
+    import fannotate.lm as lm
+
+    lm.response_cache.enabled = args.cache
+    latencies = []
+    instrument_requests(lm, latencies)
+    server, mock_settings, root_url = start_mock_server(args.latency, args.jitter, args.error_rate)
+
+    results = []
+    try:
+        for framework in args.frameworks:
+            configure_backend(lm, framework, root_url, args)
+            for rows in args.rows:
+                for scenario in args.scenarios:
+                    result = run_scenario(scenario, rows, framework, args, lm, mock_settings, latencies)
+                    results.append(result)
+                    print(f"{scenario:>14} {framework:>12} {rows:>7} rows: {result['rows_per_sec']:>9.1f} rows/s, "
+                          f"p50 {result['latency_p50_ms']} ms, p99 {result['latency_p99_ms']} ms, "
+                          f"backup {result['backup_seconds']} s, peak RSS {result['peak_rss_mb']} MB")
+    finally:
+        server.shutdown()
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": vars(args),
+        "results": results
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"Results written to {output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
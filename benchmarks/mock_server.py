@@ -0,0 +1,178 @@
+"""
+Local stand-in for the LLM backends used by Fannotate.
+
+Serves an OpenAI-compatible /v1/chat/completions endpoint (with vLLM's
+guided_choice / guided_json extensions), plus the TN-GenAI /chat and token
+endpoints. Latency, jitter and error rate are configurable so throughput can
+be measured offline.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockSettings:
+    def __init__(self, latency=0.05, jitter=0.02, error_rate=0.0, token_expires_in=3600):
+        self.latency = latency            # Mean seconds per request
+        self.jitter = jitter              # Uniform +/- seconds around the mean
+        self.error_rate = error_rate      # Share of requests answered with 503
+        self.token_expires_in = token_expires_in
+        self.requests = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+
+def _pick(options, prompt):
+    """Deterministic choice so repeated prompts get the same answer"""
+    digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+    return options[digest[0] % len(options)]
+
+
+def _token_logprobs(content, prompt):
+    """Deterministic log-probabilities, one 'token' per word of the answer"""
+    digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+    return [
+        {"token": word, "logprob": -digest[i % len(digest)] / 128, "bytes": list(word.encode("utf-8")), "top_logprobs": []}
+        for i, word in enumerate(content.split() or [content])
+    ]
+
+
+def _answer_for_schema(schema, prompt):
+    answer = {}
+    for key, prop in schema.get("properties", {}).items():
+        if "enum" in prop:
+            answer[key] = _pick(prop["enum"], prompt + key)
+        else:
+            answer[key] = f"Mock summary for {key}."
+    return answer
+
+
+def _answer_genai_message(message):
+    """TN-GenAI has no structured output, so read the constraints back out of the prompt"""
+    schema_marker = "follows this JSON schema:\n"
+    if schema_marker in message:
+        schema = json.loads(message.split(schema_marker, 1)[1])
+        return json.dumps(_answer_for_schema(schema, message))
+    options_marker = "one of these options: "
+    if options_marker in message:
+        options = [option.strip() for option in message.rsplit(options_marker, 1)[1].split(",")]
+        return _pick(options, message)
+    return "Mock summary of the conversation."
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog is too small for hundreds of concurrent clients
+    request_queue_size = 1024
+
+
+def make_handler(settings):
+    class MockHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _simulate(self):
+            """Sleeps for the configured latency; returns False if this request should fail"""
+            with settings.lock:
+                settings.requests += 1
+            delay = max(0.0, settings.latency + random.uniform(-settings.jitter, settings.jitter))
+            time.sleep(delay)
+            if random.random() < settings.error_rate:
+                with settings.lock:
+                    settings.errors += 1
+                self._send_json(503, {"error": {"message": "Mock overload"}}, {"Retry-After": "0"})
+                return False
+            return True
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            raw = self.rfile.read(length) if length else b""
+
+            if self.path.endswith("/token"):
+                self._send_json(200, {
+                    "access_token": f"mock-token-{time.time():.0f}",
+                    "token_type": "Bearer",
+                    "expires_in": settings.token_expires_in
+                })
+                return
+
+            body = json.loads(raw or b"{}")
+            if not self._simulate():
+                return
+
+            if self.path.endswith("/chat/completions"):
+                prompt = body["messages"][-1]["content"]
+                extra_schema = body.get("guided_json")
+                response_format = body.get("response_format") or {}
+                if response_format.get("type") == "json_schema":
+                    extra_schema = response_format["json_schema"]["schema"]
+                if body.get("guided_choice"):
+                    content = _pick(body["guided_choice"], prompt)
+                elif extra_schema:
+                    content = json.dumps(_answer_for_schema(extra_schema, prompt))
+                else:
+                    content = "Mock summary of the conversation."
+                choice = {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }
+                if body.get("logprobs"):
+                    choice["logprobs"] = {"content": _token_logprobs(content, prompt)}
+                self._send_json(200, {
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "mock"),
+                    "choices": [choice],
+                    "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 5, "total_tokens": len(prompt) // 4 + 5}
+                })
+            elif self.path.endswith("/chat"):
+                self._send_json(200, {"response": _answer_genai_message(body.get("message", ""))})
+            else:
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    return MockHandler
+
+
+def start_mock_server(latency=0.05, jitter=0.02, error_rate=0.0, host="127.0.0.1", port=0):
+    """Starts the mock server in a daemon thread and returns (server, settings, root_url)"""
+    settings = MockSettings(latency, jitter, error_rate)
+    server = MockServer((host, port), make_handler(settings))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    root_url = f"http://{host}:{server.server_address[1]}"
+    return server, settings, root_url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the mock LLM server on its own")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, settings, root_url = start_mock_server(args.latency, args.jitter, args.error_rate, port=args.port)
+    print(f"Mock LLM server on {root_url} (OpenAI base URL: {root_url}/v1/)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
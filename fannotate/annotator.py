@@ -1,9 +1,18 @@
 import pandas as pd
 import json
 from pathlib import Path
-import gradio as gr
 from datetime import datetime
 import shutil
+import threading
+import os
+import copy
+import hashlib
+import pyarrow as pa
+from fannotate.journal import AnnotationJournal
+from fannotate.workbook import WorkbookCache
+from fannotate.codebook import Codebook
+from fannotate.assignment import AssignmentQueue
+from fannotate.constants import ANNOTATION_JOURNAL_COMPACT_EVERY, ANNOTATION_JOURNAL_FSYNC
 
 class TranscriptionAnnotator:
     def __init__(self):
@@ -14,7 +23,24 @@ class TranscriptionAnnotator:
         self.upload_dir = Path("uploads/")
         self.upload_dir.mkdir(exist_ok=True)
         self.codebook_path = self.upload_dir / "codebook.json"
+        self._codebook = None               # Parsed codebook, reloaded when the file changes
+        self._codebook_key = None
         self.backup_path = None
+        self.source_key = None              # Identifies the loaded file, sheet and column across runs
+        self.workbook = WorkbookCache()
+        self.journal = None
+        self._lock = threading.RLock()      # Guards table edits against snapshot copies
+        self._snapshot_lock = threading.Lock()  # One snapshot write at a time
+        self._compaction = None             # Background snapshot thread, if one is running
+        self.row_versions = {}              # Row -> edit count, for optimistic concurrency between sessions
+        self.result_versions = {}           # Row -> auto-fill results stored, so cached rows are redrawn
+        self.table_version = 0              # Bumped on every change to the table
+        self.column_versions = {}           # Column -> edit count, so analyses only redo changed columns
+        self._layout_version = 0            # Bumped when the table is replaced or changed in bulk
+        self._column_arrays = {}            # Column -> NumPy view, valid for _arrays_version
+        self._arrays_version = None
+        self.assignments = AssignmentQueue(self)
+        self.recover_journals()
 
     def backup_existing_codebook(self):
         if self.codebook_path.exists():
@@ -31,8 +57,7 @@ class TranscriptionAnnotator:
         }
         
         #self.backup_existing_codebook() ## Disabling backup
-        with open(self.codebook_path, 'w') as f:
-            json.dump(codebook, f, indent=4)
+        self.write_codebook(codebook)
         return "New empty codebook created successfully"
 
     def upload_file(self, file, codebook_file=None):
@@ -47,8 +72,7 @@ class TranscriptionAnnotator:
             elif not self.codebook_path.exists():
                 self.create_codebook()
             
-            xl = pd.ExcelFile(self.excel_file)
-            sheet_names = xl.sheet_names
+            sheet_names = self.workbook.sheet_names(self.excel_file)
             return "File uploaded successfully", sheet_names, []
         except Exception as e:
             return f"Error loading file: {str(e)}", [], []
@@ -64,6 +88,7 @@ class TranscriptionAnnotator:
             
             #self.backup_existing_codebook() ## Disabling backup
             shutil.copy2(file.name, self.codebook_path)
+            self.invalidate_codebook()
             return "Codebook uploaded and loaded successfully"
         except json.JSONDecodeError:
             return "Error: Invalid JSON format in codebook file"
@@ -74,37 +99,55 @@ class TranscriptionAnnotator:
         if not self.excel_file or not sheet_name:
             return []
         try:
-            temp_df = pd.read_excel(self.excel_file, sheet_name=sheet_name)
-            return temp_df.columns.tolist()
+            return self.workbook.columns(self.excel_file, sheet_name)
         except:
             return []
 
-    def load_settings(self, sheet_name, column_name):
+    def load_settings(self, sheet_name, column_name, progress=None):
+        """Creates the annotation table from one column, streaming it in chunks (progress counts rows)"""
         if not self.excel_file:
-            return "No file loaded", gr.DataFrame(visible=False), "", [], []
+            return "No file loaded", None
         
         try:
-            temp_df = pd.read_excel(self.excel_file, sheet_name=sheet_name)
-            if column_name not in temp_df.columns:
-                return f"Column '{column_name}' not found in sheet", gr.DataFrame(visible=False), "", [], []
+            if column_name not in self.workbook.columns(self.excel_file, sheet_name):
+                return f"Column '{column_name}' not found in sheet", None
+            texts = self.workbook.read_column(self.excel_file, sheet_name, column_name, progress)
+            source_key = self._source_key(sheet_name, column_name)
             
-            self.df = pd.DataFrame()
-            self.df['ID'] = range(1, len(temp_df) + 1)
-            self.df['text'] = temp_df[column_name]
-            self.df['is_reviewed'] = False
-            self.selected_column = 'text'
-            self.current_index = 0
+            df = pd.DataFrame()
+            df['ID'] = range(1, len(texts) + 1)
+            df['text'] = pd.Series(texts, dtype=object)
+            df['is_reviewed'] = False
+            restored = self.replay_checkpoints(df, source_key)
             
             # Create a timestamp-based backup path
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            self.backup_path = self.upload_dir / f"annotations_{timestamp}.xlsx"
             
-            status_msg = f"Created table. This will be backed up on the server filesystem as: {self.backup_path}"
+            # Swap the table in at once, so other sessions never see it half replaced
+            with self._lock:
+                previous_journal = self.journal
+                self.df = df
+                self.source_key = source_key
+                self.selected_column = 'text'
+                self.current_index = 0
+                self.row_versions = {}
+                self.result_versions = {}
+                self.column_versions = {}
+                self.backup_path = self.upload_dir / f"annotations_{timestamp}.parquet"
+                self.journal = AnnotationJournal(self.get_journal_path(), fsync=ANNOTATION_JOURNAL_FSYNC)
+                self.mark_table_changed()
+            if previous_journal is not None:
+                previous_journal.close()
+            self.assignments.reset()
+            
+            status_msg = f"Created table with {len(self.df):,} rows. This will be backed up on the server filesystem as: {self.backup_path}"
+            if restored:
+                status_msg += f"\nRestored {restored:,} auto-fill results from earlier runs on this data"
             self.backup_df() 
             return status_msg, self.df
             
         except Exception as e:
-            return f"Error applying settings: {str(e)}", gr.DataFrame(visible=False), "", [], []
+            return f"Error applying settings: {str(e)}", None
 
     def create_codebook(self):
         if not self.codebook_path.exists():
@@ -113,67 +156,64 @@ class TranscriptionAnnotator:
                 "dataset": Path(self.excel_file).name if self.excel_file else "",
                 "codes": []
             }
-            with open(self.codebook_path, 'w') as f:
-                json.dump(codebook, f, indent=4)
+            self.write_codebook(codebook)
+
+    def get_codebook(self):
+        """Returns the parsed codebook, re-reading the file only when it has changed"""
+        try:
+            stat = self.codebook_path.stat()
+            key = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            key = None
+        if self._codebook is None or key != self._codebook_key:
+            self._codebook = Codebook.from_file(self.codebook_path) if key else Codebook()
+            self._codebook_key = key
+        return self._codebook
+
+    def invalidate_codebook(self):
+        """Forces the next get_codebook call to re-read the file"""
+        self._codebook = None
+
+    def edit_codebook(self):
+        """Returns a copy of the codebook JSON that can be modified and passed to write_codebook"""
+        return copy.deepcopy(self.get_codebook().data)
+
+    def write_codebook(self, codebook):
+        """Saves the codebook JSON and refreshes the parsed copy"""
+        with open(self.codebook_path, 'w') as f:
+            json.dump(codebook, f, indent=4)
+        self.invalidate_codebook()
 
     def load_codebook(self):
-        if not self.codebook_path.exists():
-            return []
-        with open(self.codebook_path, 'r') as f:
-            return json.load(f)['codes']
+        return self.get_codebook().codes
 
     def get_code_values(self, code_name):
-        if not self.codebook_path.exists() or not code_name:
+        if not code_name:
             return []
         try:
-            with open(self.codebook_path, 'r') as f:
-                codebook = json.load(f)
-                for code in codebook['codes']:
-                    if code['attribute'] == code_name:
-                        return [v['category'] for v in code['categories']]
-            return []
+            return self.get_codebook().category_values(code_name)
         except Exception as e:
             print(f"Error getting code values: {e}")
             return []
 
-    def save_annotation(self, code_name, value):
+    def save_annotation(self, code_name, value, row=None):
         """
-        Save an annotation for the current transcript.
+        Save an annotation for a transcript.
         
         Args:
             code_name (str): The name of the code/category
             value (str): The annotation value
+            row (int): The row to annotate, defaults to the current index
         """
         try:
             if self.df is None:
                 return "No data loaded", None
             
-            # Clean the column name
-            clean_name = code_name.strip().replace('[','').replace(']','').replace("'", '').replace(" ", '_')
-            column_name = f"user_{clean_name}"
-            
-            # Get the attribute type from codebook
-            codebook = self.load_codebook()
-            attr_type = 'categorical'  # default
-            for code in codebook:
-                if code['attribute'] == code_name:
-                    attr_type = code.get('type', 'categorical')
-                    break
-            
-            # For freetext type, use the value as-is without any processing
-            # For categorical type, continue with existing processing
-            if attr_type == 'freetext':
-                annotation_value = value
-            else:
-                # Strip any emoji prefix if present
-                annotation_value = value.split()[-1] if value else None
-            
-            # Save the annotation
-            self.df.at[self.current_index, column_name] = annotation_value
-            self.df.at[self.current_index, 'is_reviewed'] = True
+            column_name, annotation_value = self._annotation_cell(code_name, value)
             
-            # Backup after each annotation
-            self.backup_df()
+            # Save the annotation and journal the edit instead of rewriting the whole backup
+            self.record_edit(self.current_index if row is None else row,
+                             {column_name: annotation_value, 'is_reviewed': True})
             
             return f"Saved annotation for {code_name}: {annotation_value}", annotation_value
             
@@ -181,6 +221,116 @@ class TranscriptionAnnotator:
             print(f"Error saving annotation: {e}")
             return f"Error saving annotation: {str(e)}", None
 
+    def save_annotations(self, row, annotations, expected_version=None):
+        """
+        Saves several annotations for one row as a single edit.
+        
+        Args:
+            row (int): The row to annotate
+            annotations (dict): Code name -> annotation value
+            expected_version (int): Version of the row the reviewer saw. If another session
+                changed the row since then, nothing is saved
+        
+        Returns:
+            (saved, messages) where saved is False on a conflict or error
+        """
+        try:
+            with self._lock:
+                if self.df is None:
+                    return False, ["No data loaded"]
+                if expected_version is not None and self.row_version(row) != expected_version:
+                    return False, [f"Index {row} was changed by another reviewer. Their annotations are shown now, submit again to save yours"]
+                
+                values = {}
+                messages = []
+                for code_name, value in annotations.items():
+                    column_name, annotation_value = self._annotation_cell(code_name, value)
+                    values[column_name] = annotation_value
+                    messages.append(f"Saved annotation for {code_name}: {annotation_value}")
+                values['is_reviewed'] = True
+                self.record_edit(row, values)
+                return True, messages
+        except Exception as e:
+            print(f"Error saving annotations: {e}")
+            return False, [f"Error saving annotation: {str(e)}"]
+
+    def undo_edit(self, row, previous, expected_version):
+        """
+        Restores the cells an edit overwrote. Returns False, and changes nothing, if the
+        row was changed again since the edit (its version is no longer expected_version)
+        """
+        with self._lock:
+            if self.df is None or self.row_version(row) != expected_version:
+                return False
+            self.record_edit(row, previous)
+            return True
+
+    def _annotation_cell(self, code_name, value):
+        """Returns the (column, value) an annotation is stored as"""
+        # Clean the column name
+        clean_name = code_name.strip().replace('[','').replace(']','').replace("'", '').replace(" ", '_')
+        column_name = f"user_{clean_name}"
+        
+        # Get the attribute type from codebook
+        attr_type = self.get_codebook().attribute_type(code_name)
+        
+        # For freetext type, use the value as-is without any processing
+        # For categorical type, continue with existing processing
+        if attr_type == 'freetext':
+            annotation_value = value
+        else:
+            # Strip any emoji prefix if present
+            annotation_value = value.split()[-1] if value else None
+        return column_name, annotation_value
+
+    def row_version(self, row):
+        return self.row_versions.get(row, 0)
+
+    def read_cells(self, row, columns):
+        """
+        Returns {column: value} for some cells of a row (by position) and the row's version.
+        Cells are read from cached column arrays, so no row Series is built.
+        """
+        with self._lock:
+            # Views are dropped when the table is edited or replaced
+            arrays_version = (self.table_version, id(self.df))
+            if self._arrays_version != arrays_version:
+                self._column_arrays = {}
+                self._arrays_version = arrays_version
+            cells = {}
+            for column in columns:
+                values = self._column_arrays.get(column)
+                if values is None:
+                    values = self._column_arrays[column] = self.df[column].to_numpy()
+                cells[column] = values[row]
+            return cells, self.row_version(row)
+
+    def row_state(self, row):
+        """Returns a key that changes whenever the row may have changed, for caching rendered rows"""
+        with self._lock:
+            return self._layout_version, self.row_version(row), self.result_versions.get(row, 0)
+
+    def read_rows(self, rows):
+        """Returns a copy of the rows with the given index labels, e.g. one page of a table view"""
+        with self._lock:
+            return self.df.loc[rows].copy()
+
+    def mark_table_changed(self):
+        """Records a change to the whole table, such as loading a new one"""
+        with self._lock:
+            self.table_version += 1
+            self._layout_version += 1
+
+    def data_version(self, columns):
+        """Returns a key that changes whenever one of the columns changes"""
+        with self._lock:
+            return (self._layout_version,) + tuple(self.column_versions.get(column, 0) for column in columns)
+
+    def read_columns(self, columns):
+        """Returns a consistent copy of some columns and their data_version"""
+        with self._lock:
+            return self.df[list(columns)].copy(), self.data_version(columns)
+
     def navigate_transcripts(self, direction):
         if self.df is None or self.selected_column is None:
             return None, None
@@ -196,11 +346,24 @@ class TranscriptionAnnotator:
 
     def save_excel(self):
         """Saves the current data to an excel file for download"""
+        return self.export_table("xlsx")
+
+    def export_table(self, file_format="xlsx"):
+        """Saves the current data for download as Excel, CSV or Parquet"""
         if self.df is None:
             return None, "No data to save"
         try:
-            output_path = self.upload_dir / "annotated_transcripts.xlsx"
-            self.df.to_excel(output_path, index=False)
+            output_path = self.upload_dir / f"annotated_transcripts.{file_format}"
+            with self._lock:
+                df = self.df.copy()
+            if file_format == "xlsx":
+                df.to_excel(output_path, index=False)
+            elif file_format == "csv":
+                df.to_csv(output_path, index=False)
+            elif file_format == "parquet":
+                _write_snapshot_atomic(df, output_path)
+            else:
+                return None, f"Unsupported export format: {file_format}"
             return str(output_path), "File saved successfully"
         except Exception as e:
             return None, f"Error saving file: {str(e)}"
@@ -227,15 +390,183 @@ class TranscriptionAnnotator:
         except Exception as e:
             return None, f"Error saving codebook: {str(e)}"
         
+    def _source_key(self, sheet_name, column_name):
+        """
+        Returns a key for the loaded data that stays the same when it is loaded again. The
+        file's content is hashed, as uploads are copied to a new temporary file each time
+        and another file can have the same name and size.
+        """
+        digest = hashlib.sha1()
+        with open(self.excel_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        digest.update(f"|{sheet_name}|{column_name}".encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    def get_checkpoint_path(self, output_column):
+        """
+        Returns the auto-fill checkpoint journal for a column of the current table. It is
+        keyed on the source file, sheet and column rather than the backup, so loading
+        the same data again restores the results (see replay_checkpoints).
+        """
+        if self.source_key is None:
+            return None
+        return self.upload_dir / f"checkpoint_{self.source_key}_{output_column}.jsonl"
+
+    def replay_checkpoints(self, df, source_key):
+        """Fills the auto-fill columns of a new table from checkpoints of earlier runs on the same data"""
+        restored = 0
+        for checkpoint_path in sorted(self.upload_dir.glob(f"checkpoint_{source_key}_*.jsonl")):
+            try:
+                columns = {}
+                for row, values in AnnotationJournal(checkpoint_path).entries():
+                    if row not in df.index:
+                        continue
+                    for column, value in values.items():
+                        columns.setdefault(column, {})[row] = value
+                    restored += 1
+                for column, cells in columns.items():
+                    if column not in df.columns:
+                        df[column] = None
+                    df.loc[list(cells), column] = pd.Series(cells, dtype=object)
+            except Exception as e:
+                print(f"Error replaying checkpoint {checkpoint_path}: {e}")
+        return restored
+
+    def autofill_writer(self):
+        """Returns an AutofillWriter for the current table, to pass to lm.batch_process_tasks"""
+        return AutofillWriter(self)
+
+    def get_journal_path(self):
+        """Returns the edit journal that belongs to the backup of the current table"""
+        if self.backup_path is None:
+            return None
+        return self.upload_dir / f"{Path(self.backup_path).stem}.journal.jsonl"
+
+    def record_edit(self, row, values):
+        """Applies an edit to the table and appends it to the journal"""
+        with self._lock:
+            for column, value in values.items():
+                self.df.at[row, column] = value
+            self.row_versions[row] = self.row_version(row) + 1
+            self.table_version += 1
+            for column in values:
+                self.column_versions[column] = self.column_versions.get(column, 0) + 1
+            if self.journal is not None:
+                self.journal.append(row, values)
+                if self.journal.pending >= ANNOTATION_JOURNAL_COMPACT_EVERY:
+                    self.compact_in_background()
+
+    def compact_in_background(self):
+        """Folds the journal into a fresh backup on a background thread"""
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+        self._compaction = threading.Thread(target=self.backup_df, daemon=True)
+        self._compaction.start()
+
+    def recover_journals(self):
+        """
+        Replays journals left behind by a previous run into their backups, so edits
+        made after the last snapshot are not lost when the app stops unexpectedly.
+        """
+        for journal_path in sorted(self.upload_dir.glob("*.journal.jsonl*")):
+            stem = journal_path.name.split(".journal.jsonl")[0]
+            journal = AnnotationJournal(self.upload_dir / f"{stem}.journal.jsonl")
+            backup_path = self.upload_dir / f"{stem}.parquet"
+            if not journal.has_entries():
+                continue  # Already handled together with its rotated file
+            if not backup_path.exists():
+                print(f"Found journal {journal_path} without backup {backup_path}, skipping recovery")
+                continue
+            try:
+                df = read_snapshot(backup_path)
+                applied = journal.replay(df)
+                journal.rotate()
+                _write_snapshot_atomic(df, backup_path)
+                journal.commit_rotation()
+                print(f"Recovered {applied} journaled edits into {backup_path}")
+            except Exception as e:
+                print(f"Error recovering journal {journal_path}: {e}")
+
     def get_sortable_columns(self):
         if self.df is not None:
             return self.df.columns.tolist()
         return []
     
     def backup_df(self):
-        """Automatically backup the DataFrame to Excel with timestamp"""
+        """
+        Writes a full Parquet snapshot of the DataFrame to the backup file and clears the
+        journal. The table is copied under the lock, so saves can continue while
+        the snapshot is written.
+        """
         if self.df is not None and self.backup_path is not None:
             try:
-                self.df.to_excel(self.backup_path, index=False)
+                with self._snapshot_lock:
+                    with self._lock:
+                        # The table may be replaced while the snapshot is written
+                        snapshot = self.df.copy()
+                        backup_path, journal = self.backup_path, self.journal
+                        if journal is not None:
+                            journal.rotate()
+                    _write_snapshot_atomic(snapshot, backup_path)
+                    if journal is not None:
+                        journal.commit_rotation()
             except Exception as e:
-                print(f"Error backing up DataFrame: {e}")
\ No newline at end of file
+                print(f"Error backing up DataFrame: {e}")
+
+
+class AutofillWriter:
+    """
+    Stores the results of an auto-fill batch in the annotator's table. Writes hold the
+    annotator's lock and bump the versions readers cache on, like record_edit, but are
+    not journaled: the batch's checkpoint already has them. Results for a table that
+    was replaced while the batch ran are dropped.
+    """
+
+    def __init__(self, annotator):
+        self.annotator = annotator
+        self.df = annotator.df
+
+    def add_columns(self, columns, clear=False):
+        """Adds empty result columns, or empties existing ones when clear is set"""
+        annotator = self.annotator
+        with annotator._lock:
+            if annotator.df is not self.df:
+                return
+            added = [column for column in columns if clear or column not in self.df.columns]
+            for column in added:
+                self.df[column] = None
+                annotator.column_versions[column] = annotator.column_versions.get(column, 0) + 1
+            if added:
+                annotator.mark_table_changed()
+
+    def write_cells(self, row, values):
+        """Stores one row's results"""
+        annotator = self.annotator
+        with annotator._lock:
+            if annotator.df is not self.df:
+                return
+            for column, value in values.items():
+                self.df.at[row, column] = value
+            annotator.result_versions[row] = annotator.result_versions.get(row, 0) + 1
+            annotator.table_version += 1
+            for column in values:
+                annotator.column_versions[column] = annotator.column_versions.get(column, 0) + 1
+
+
+def read_snapshot(path, memory_map=True):
+    """Reads a Parquet table snapshot, memory-mapping the file by default"""
+    return pd.read_parquet(path, memory_map=memory_map)
+
+
+def _write_snapshot_atomic(df, path):
+    """Writes Parquet to a temporary file first so a crash never leaves a half-written backup"""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        df.to_parquet(tmp_path, index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Columns read from Excel can mix numbers and text, which Parquet cannot store
+        df.astype({column: "string" for column in df.columns if df[column].dtype == object}) \
+            .to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
\ No newline at end of file
@@ -0,0 +1,214 @@
+import threading
+import time
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from fannotate.constants import ASSIGNMENT_BATCH_SIZE, ASSIGNMENT_LEASE_SECONDS, REVIEW_ORDER_REFRESH_EDITS
+from fannotate.metrics import ResultCache
+from fannotate.sampling import informative_order
+
+
+def _table_order(df, candidates, codebook):
+    return candidates
+
+
+def _lowest_confidence_first(df, candidates, codebook):
+    """Orders rows by their lowest value in any *_confidence column; rows without one go last"""
+    confidence_columns = [column for column in df.columns if str(column).endswith("_confidence")]
+    if not confidence_columns:
+        return candidates
+    scores = df.loc[candidates, confidence_columns].apply(pd.to_numeric, errors="coerce").min(axis=1)
+    return scores.sort_values(na_position="last", kind="stable").index
+
+
+def _unreviewed_rows(df):
+    return df.index[~df['is_reviewed'].fillna(False).astype(bool)]
+
+
+# Name -> function(df, candidate index, codebook) returning the candidates in the order they should be reviewed
+PRIORITIES = {
+    "order": _table_order,
+    "low_confidence": _lowest_confidence_first,
+    "informative": informative_order,
+}
+
+
+class AssignmentQueue:
+    """
+    Hands out unreviewed rows to reviewers in leased batches, so several people can
+    work through one table without annotating the same text twice. A lease expires
+    after lease_seconds, and rows a reviewer skips go back to the pool.
+    """
+
+    def __init__(self, annotator, batch_size=ASSIGNMENT_BATCH_SIZE, lease_seconds=ASSIGNMENT_LEASE_SECONDS):
+        self.annotator = annotator
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self._leases = {}   # Row -> (reviewer, expires_at)
+        self._batches = {}  # Reviewer -> deque of leased rows
+        self._skipped = {}  # Reviewer -> rows they skipped, not offered to them again
+        self._lock = threading.Lock()
+        self._rankings = ResultCache(max_entries=8)
+        self._latest_rankings = {}  # Priority -> (table, ranking) last finished, used while a new one is computed
+        self._ranking_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fannotate-ranking")
+
+    def reset(self):
+        """Drops all leases, e.g. when a new table is loaded"""
+        with self._lock:
+            self._leases = {}
+            self._batches = {}
+            self._skipped = {}
+
+    def next_row(self, reviewer, priority="order"):
+        """Returns the next row for a reviewer, leasing a new batch when needed, or None when done"""
+        if self.annotator.df is None:
+            return None
+        # Fetched before taking the lock, so a ranking being computed never holds up other reviewers
+        ranked = self.ranking(priority) if priority in PRIORITIES and priority != "order" else None
+        with self._lock:
+            batch = self._batches.setdefault(reviewer, deque())
+            while True:
+                while batch:
+                    row = batch[0]
+                    if self._holds(reviewer, row) and not self._is_reviewed(row):
+                        # Using a row renews its lease
+                        self._leases[row] = (reviewer, time.monotonic() + self.lease_seconds)
+                        return row
+                    batch.popleft()
+                if not self._lease_batch(reviewer, ranked):
+                    return None
+
+    def complete(self, reviewer, row):
+        """Releases a row after the reviewer saved it"""
+        with self._lock:
+            self._drop(reviewer, row)
+
+    def skip(self, reviewer, row):
+        """Returns a row to the pool for other reviewers"""
+        with self._lock:
+            self._drop(reviewer, row)
+            self._skipped.setdefault(reviewer, set()).add(row)
+
+    def stats(self):
+        """Returns (active leases, reviewers with a batch)"""
+        with self._lock:
+            now = time.monotonic()
+            active = sum(1 for _, expires_at in self._leases.values() if expires_at > now)
+            return active, sum(1 for batch in self._batches.values() if batch)
+
+    def following_row(self, row, priority="order"):
+        """
+        Returns the row to review after row when moving on without assignments: the next
+        row in table order, or the next unreviewed row in the priority's ranking
+        """
+        df = self.annotator.df
+        if df is None:
+            return None
+        if priority not in PRIORITIES or priority == "order":
+            return min(row + 1, len(df) - 1)
+        ranking, rank = self.ranking(priority)
+        start = rank.get(row, -1) + 1
+        for candidate in ranking[start:]:
+            if not self._is_reviewed(candidate):
+                return candidate
+        # Past the end of the ranking, or the row was not in it: best unreviewed row overall
+        for candidate in ranking[:start]:
+            if not self._is_reviewed(candidate):
+                return candidate
+        return None
+
+    def ranking(self, priority):
+        """
+        Returns (unreviewed rows in priority order, {row: rank}). The ranking is recomputed
+        in the background when the predictions change and after every
+        REVIEW_ORDER_REFRESH_EDITS reviews; until then the previous ranking is used, and
+        rows reviewed in between are skipped by following_row
+        """
+        columns = list(self.annotator.df.columns)
+        inputs = [column for column in columns
+                  if str(column).startswith('autofill_') or str(column).endswith('_confidence')]
+        key = (
+            priority,
+            self.annotator.data_version(inputs),
+            self.annotator.column_versions.get('is_reviewed', 0) // REVIEW_ORDER_REFRESH_EDITS
+        )
+
+        def compute():
+            # A consistent copy of the columns the priorities use, taken under the annotator's lock
+            view, _ = self.annotator.read_columns(
+                [column for column in columns if column == 'is_reviewed' or column in inputs
+                 or str(column).startswith('user_')]
+            )
+            unreviewed = _unreviewed_rows(view)
+            ranking = list(PRIORITIES[priority](view, unreviewed, self.annotator.get_codebook()))
+            return ranking, {row: rank for rank, row in enumerate(ranking)}
+
+        future = self._rankings.get_or_submit(key, compute, self._ranking_pool)
+        table = key[1][0]  # Changes when the table is replaced or auto-filled
+        latest = self._latest_rankings.get(priority)
+        # A ranking for other predictions is of no use; wait for the new one then
+        if not future.done() and latest is not None and latest[0] == table:
+            return latest[1]
+        result = future.result()
+        self._latest_rankings[priority] = (table, result)
+        return result
+
+    def _lease_batch(self, reviewer, ranked=None):
+        """
+        Leases the next free unreviewed rows to the reviewer, in the order of ranked (a
+        result of ranking) or else in table order
+        """
+        df = self.annotator.df
+        if df is None or 'is_reviewed' not in df.columns:
+            return False
+        now = time.monotonic()
+        # Expired leases go back to the pool
+        for row, (_, expires_at) in list(self._leases.items()):
+            if expires_at <= now:
+                del self._leases[row]
+
+        view, _ = self.annotator.read_columns(['is_reviewed'])
+        unreviewed = _unreviewed_rows(view)
+        excluded = set(self._leases) | self._skipped.get(reviewer, set())
+        candidates = unreviewed[~unreviewed.isin(excluded)] if excluded else unreviewed
+        if len(candidates) == 0:
+            return False
+
+        if ranked is None:
+            rows = candidates[:self.batch_size].tolist()
+        else:
+            ranking, rank = ranked
+            reviewed = view['is_reviewed'].fillna(False).astype(bool)
+            free = (row for row in ranking
+                    if row not in excluded and row in reviewed.index and not reviewed.at[row])
+            rows = list(islice(free, self.batch_size))
+            if len(rows) < self.batch_size:
+                # Rows that became unreviewed after the ranking was made come last, in table order
+                unranked = (row for row in candidates if row not in rank)
+                rows += list(islice(unranked, self.batch_size - len(rows)))
+        expires_at = now + self.lease_seconds
+        for row in rows:
+            self._leases[row] = (reviewer, expires_at)
+        self._batches[reviewer].extend(rows)
+        return True
+
+    def _holds(self, reviewer, row):
+        lease = self._leases.get(row)
+        return lease is not None and lease[0] == reviewer
+
+    def _is_reviewed(self, row):
+        df = self.annotator.df
+        if df is None or row not in df.index:
+            return True
+        value = df.at[row, 'is_reviewed']
+        return bool(value) if pd.notna(value) else False
+
+    def _drop(self, reviewer, row):
+        if self._holds(reviewer, row):
+            del self._leases[row]
+        batch = self._batches.get(reviewer)
+        if batch and row in batch:
+            batch.remove(row)
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class ResponseCache:
+    """
+    Disk-backed cache of LLM responses, keyed by a hash of everything that
+    determines the completion (framework, model, prompt, allowed values,
+    temperature and max tokens).
+    """
+
+    def __init__(self, path, max_entries=200000, max_age_days=30):
+        self.path = Path(path)
+        self.path.parent.mkdir(exist_ok=True)
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_created_at ON responses (created_at)")
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(framework, model, prompt, values=None, temperature=None, max_tokens=None, schema=None,
+                 logprobs=False):
+        """Creates the content hash used as cache key"""
+        request = {
+            "framework": framework,
+            "model": model,
+            "prompt": prompt,
+            "values": list(values) if values else None,
+            "schema": schema,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        if logprobs:
+            # Responses with log-probabilities are stored differently; other keys stay as they were
+            request["logprobs"] = True
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns the cached response or None, and updates the hit/miss counters"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or self._is_expired(row[1]):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        """Stores a response, evicting old entries every so often"""
+        if not self.enabled or response is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at) VALUES (?, ?, ?)",
+                (key, response, time.time())
+            )
+            self._conn.commit()
+            self._writes += 1
+            run_eviction = self._writes % 1000 == 0
+        if run_eviction:
+            self.evict()
+
+    def evict(self):
+        """Drops entries older than max_age_days and trims the table to max_entries"""
+        with self._lock:
+            if self.max_age_days:
+                cutoff = time.time() - self.max_age_days * 86400
+                self._conn.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,))
+            if self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            self._conn.commit()
+
+    def clear(self):
+        """Removes all cached responses and resets the counters"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Returns the current (hits, misses) counters"""
+        return self.hits, self.misses
+
+    def _is_expired(self, created_at):
+        return bool(self.max_age_days) and created_at < time.time() - self.max_age_days * 86400
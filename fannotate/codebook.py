@@ -0,0 +1,87 @@
+import json
+from pathlib import Path
+
+from fannotate.naming import clean_column_name
+
+# Prefixes of the dataframe columns that hold annotations for an attribute
+COLUMN_PREFIXES = ("autofill_", "user_")
+
+
+class Codebook:
+    """
+    Parsed codebook with lookup tables, so handlers do not have to re-read the JSON
+    file or scan the codes list on every interaction. The tables are built once per
+    codebook version. Instances are treated as read-only; edits go through
+    TranscriptionAnnotator.write_codebook.
+    """
+
+    def __init__(self, data=None):
+        self.data = data or {"codes": []}
+        self.codes = self.data.get("codes", [])
+        self.by_attribute = {code["attribute"]: code for code in self.codes}
+        self.types = {
+            code["attribute"]: code.get("type", "categorical") for code in self.codes
+        }
+        self.values = {
+            code["attribute"]: [cat["category"] for cat in code.get("categories", [])]
+            for code in self.codes
+        }
+        self.category_icons = {
+            code["attribute"]: {cat["category"]: cat.get("icon", "") for cat in code.get("categories", [])}
+            for code in self.codes
+        }
+        self.descriptions = {code["attribute"]: code.get("description", "") for code in self.codes}
+        self.category_descriptions = {
+            (code["attribute"], cat["category"]): cat.get("description", "")
+            for code in self.codes
+            for cat in code.get("categories", [])
+        }
+        # Column name -> attribute, for both the raw and the cleaned attribute name
+        self.column_attributes = {}
+        for code in self.codes:
+            for name in (code["attribute"], clean_column_name(code["attribute"])):
+                for prefix in COLUMN_PREFIXES:
+                    self.column_attributes.setdefault(f"{prefix}{name}", code["attribute"])
+
+    @classmethod
+    def from_file(cls, path):
+        path = Path(path)
+        if not path.exists():
+            return cls()
+        with open(path, 'r') as f:
+            return cls(json.load(f))
+
+    @property
+    def attributes(self):
+        return [code["attribute"] for code in self.codes]
+
+    def get(self, attribute):
+        """Returns the code entry for an attribute, or None"""
+        return self.by_attribute.get(attribute)
+
+    def attribute_type(self, attribute, default="categorical"):
+        return self.types.get(attribute, default)
+
+    def category_values(self, attribute):
+        return list(self.values.get(attribute, []))
+
+    def icon(self, attribute, category):
+        return self.category_icons.get(attribute, {}).get(category, "")
+
+    def has_category(self, attribute, category):
+        return category in self.category_icons.get(attribute, {})
+
+    def description(self, attribute, category=None):
+        if category is None:
+            return self.descriptions.get(attribute, "")
+        return self.category_descriptions.get((attribute, category), "")
+
+    def column_attribute(self, column):
+        """Returns the attribute an autofill_/user_ column belongs to, or None"""
+        return self.column_attributes.get(column)
+
+    @staticmethod
+    def columns_for(attribute):
+        """Returns the (autofill, user) column names used for an attribute"""
+        clean_name = clean_column_name(attribute)
+        return f"autofill_{clean_name}", f"user_{clean_name}"
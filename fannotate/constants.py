@@ -31,3 +31,44 @@ MODEL_CHOICES = {
         "gpt-4"
     ]
 }
+
+
+# Persistent LLM response cache (stored under uploads/)
+LLM_CACHE_PATH = os.getenv("FANNOTATE_LLM_CACHE_PATH", "uploads/llm_cache.sqlite")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("FANNOTATE_LLM_CACHE_MAX_ENTRIES", "200000"))
+LLM_CACHE_MAX_AGE_DAYS = int(os.getenv("FANNOTATE_LLM_CACHE_MAX_AGE_DAYS", "30"))
+
+# Connection pool size for the shared LLM clients
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("FANNOTATE_LLM_POOL_MAX_CONNECTIONS", "64"))
+
+# Annotation journal: edits are appended per save and compacted into the table backup
+ANNOTATION_JOURNAL_COMPACT_EVERY = int(os.getenv("FANNOTATE_JOURNAL_COMPACT_EVERY", "500"))
+ANNOTATION_JOURNAL_FSYNC = os.getenv("FANNOTATE_JOURNAL_FSYNC", "1") != "0"
+
+# Streaming import of the text column: rows per chunk and the maximum memory for the text
+INGEST_CHUNK_ROWS = int(os.getenv("FANNOTATE_INGEST_CHUNK_ROWS", "50000"))
+INGEST_MEMORY_BUDGET_MB = int(os.getenv("FANNOTATE_INGEST_MEMORY_MB", "4096"))
+
+# Number of UI events of each kind that run at the same time, so reviewers are not queued behind each other
+UI_CONCURRENCY_LIMIT = int(os.getenv("FANNOTATE_UI_CONCURRENCY_LIMIT", "16"))
+
+# Work assignment for parallel reviewers: rows leased per batch and how long a lease lasts
+ASSIGNMENT_BATCH_SIZE = int(os.getenv("FANNOTATE_ASSIGNMENT_BATCH_SIZE", "20"))
+ASSIGNMENT_LEASE_SECONDS = int(os.getenv("FANNOTATE_ASSIGNMENT_LEASE_SECONDS", "1800"))
+
+# BERTScore for freetext agreement: model, CPU inference settings (0 threads keeps the torch default),
+# memoized pair scores and whether the model is loaded in the background at startup
+BERTSCORE_MODEL = os.getenv("FANNOTATE_BERTSCORE_MODEL", "bert-base-uncased")
+BERTSCORE_BATCH_SIZE = int(os.getenv("FANNOTATE_BERTSCORE_BATCH_SIZE", "64"))
+BERTSCORE_NUM_THREADS = int(os.getenv("FANNOTATE_BERTSCORE_THREADS", "0"))
+BERTSCORE_CACHE_MAX_PAIRS = int(os.getenv("FANNOTATE_BERTSCORE_CACHE_MAX_PAIRS", "200000"))
+BERTSCORE_WARMUP = os.getenv("FANNOTATE_BERTSCORE_WARMUP", "0") != "0"
+
+# Worker threads for the Analysis tab, so statistics do not hold up UI event workers
+ANALYSIS_WORKERS = int(os.getenv("FANNOTATE_ANALYSIS_WORKERS", "2"))
+
+# Rows after the current one whose review summaries are rendered ahead of time
+REVIEW_PREFETCH_ROWS = int(os.getenv("FANNOTATE_REVIEW_PREFETCH_ROWS", "5"))
+
+# Reviews after which the informativeness ranking of unreviewed rows is recomputed
+REVIEW_ORDER_REFRESH_EDITS = int(os.getenv("FANNOTATE_REVIEW_ORDER_REFRESH_EDITS", "25"))
@@ -0,0 +1,162 @@
+"""
+Streaming readers for the data sources Fannotate can annotate. Only the selected
+text column is read, in chunks, so large sources never have to be held in memory
+as a full table.
+"""
+import json
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from fannotate.constants import INGEST_CHUNK_ROWS, INGEST_MEMORY_BUDGET_MB
+
+EXCEL_EXTENSIONS = {".xlsx", ".xlsm"}
+LEGACY_EXCEL_EXTENSIONS = {".xls"}
+CSV_EXTENSIONS = {".csv", ".tsv"}
+JSONL_EXTENSIONS = {".jsonl", ".ndjson"}
+PARQUET_EXTENSIONS = {".parquet", ".pq"}
+SUPPORTED_EXTENSIONS = sorted(
+    EXCEL_EXTENSIONS | LEGACY_EXCEL_EXTENSIONS | CSV_EXTENSIONS | JSONL_EXTENSIONS | PARQUET_EXTENSIONS
+)
+
+# Rough per-value overhead of a Python string on top of its characters
+STRING_OVERHEAD_BYTES = 50
+
+
+class IngestProgress:
+    """Thread-safe row counter for a running import"""
+
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+        self.done = False
+        self._lock = threading.Lock()
+
+    def add(self, rows, nbytes):
+        with self._lock:
+            self.rows += rows
+            self.bytes += nbytes
+
+    def summary(self):
+        return f"Reading data... {self.rows:,} rows read ({self.bytes / 2**20:,.0f} MB of text)"
+
+
+def file_kind(path):
+    suffix = Path(path).suffix.lower()
+    if suffix in EXCEL_EXTENSIONS:
+        return "excel"
+    if suffix in LEGACY_EXCEL_EXTENSIONS:
+        return "xls"
+    if suffix in CSV_EXTENSIONS:
+        return "csv"
+    if suffix in JSONL_EXTENSIONS:
+        return "jsonl"
+    if suffix in PARQUET_EXTENSIONS:
+        return "parquet"
+    raise ValueError(f"Unsupported file type '{suffix}'. Supported: {', '.join(SUPPORTED_EXTENSIONS)}")
+
+
+def list_tables(path):
+    """Returns the sheet names of a workbook, or the file name for single-table formats"""
+    if file_kind(path) in ("excel", "xls"):
+        with pd.ExcelFile(path) as xl:
+            return xl.sheet_names
+    return [Path(path).stem]
+
+
+def read_header(path, sheet_name=None):
+    """Returns the column names without reading any data rows"""
+    kind = file_kind(path)
+    if kind in ("excel", "xls"):
+        return pd.read_excel(path, sheet_name=sheet_name, nrows=0).columns.tolist()
+    if kind == "csv":
+        return pd.read_csv(path, nrows=0, sep=_csv_separator(path)).columns.tolist()
+    if kind == "jsonl":
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    return list(json.loads(line).keys())
+        return []
+    import pyarrow.parquet as pq
+    return pq.ParquetFile(path).schema_arrow.names
+
+
+def iter_column_chunks(path, sheet_name, column, chunk_rows=INGEST_CHUNK_ROWS):
+    """Yields the values of one column as lists of at most chunk_rows values"""
+    kind = file_kind(path)
+    if kind == "excel":
+        yield from _iter_excel_column(path, sheet_name, column, chunk_rows)
+    elif kind == "xls":
+        # xlrd has no streaming mode, but reading a single column still saves memory
+        yield pd.read_excel(path, sheet_name=sheet_name, usecols=[column])[column].tolist()
+    elif kind == "csv":
+        for chunk in pd.read_csv(path, usecols=[column], chunksize=chunk_rows, sep=_csv_separator(path)):
+            yield chunk[column].tolist()
+    elif kind == "jsonl":
+        with pd.read_json(path, lines=True, chunksize=chunk_rows) as reader:
+            for chunk in reader:
+                yield chunk[column].tolist() if column in chunk.columns else [None] * len(chunk)
+    else:
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=[column]):
+            yield batch.column(0).to_pylist()
+
+
+def read_text_column(path, sheet_name, column, progress=None, memory_budget_mb=INGEST_MEMORY_BUDGET_MB):
+    """
+    Reads one column into a list, chunk by chunk. Raises MemoryError if the text
+    would need more than memory_budget_mb, instead of letting the server grow unbounded.
+    """
+    budget = memory_budget_mb * 2**20 if memory_budget_mb else None
+    values = []
+    used = 0
+    for chunk in iter_column_chunks(path, sheet_name, column):
+        nbytes = sum(len(value) if isinstance(value, str) else 8 for value in chunk) \
+            + STRING_OVERHEAD_BYTES * len(chunk)
+        used += nbytes
+        if budget is not None and used > budget:
+            raise MemoryError(
+                f"Column '{column}' needs more than the ingest memory budget of {memory_budget_mb} MB "
+                f"after {len(values):,} rows. Raise FANNOTATE_INGEST_MEMORY_MB or split the file."
+            )
+        values.extend(chunk)
+        if progress is not None:
+            progress.add(len(chunk), nbytes)
+    return values
+
+
+def _csv_separator(path):
+    return "\t" if Path(path).suffix.lower() == ".tsv" else ","
+
+
+def _iter_excel_column(path, sheet_name, column, chunk_rows):
+    import openpyxl
+
+    # Use the header as pandas sees it, so renamed duplicate headers map to the right position
+    header = read_header(path, sheet_name)
+    if column not in header:
+        raise KeyError(column)
+    position = header.index(column)
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(min_row=2, values_only=True)
+        chunk = []
+        blank_rows = 0
+        for row in rows:
+            if not any(cell is not None for cell in row):
+                # Trailing empty rows are dropped, like pandas does
+                blank_rows += 1
+                continue
+            if blank_rows:
+                chunk.extend([None] * blank_rows)
+                blank_rows = 0
+            chunk.append(row[position] if position < len(row) else None)
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        workbook.close()
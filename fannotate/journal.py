@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+
+class AnnotationJournal:
+    """
+    Append-only write-ahead log of edits to the annotation table. Each line holds
+    one edit as {"row": index, "values": {column: value}, "ts": timestamp}, so saving
+    an annotation costs one small append regardless of the table size.
+
+    Compaction rotates the journal aside while a snapshot of the table is written;
+    once the snapshot is on disk the rotated file is deleted. Replaying applies the
+    rotated file and then the live journal, which is safe because edits are idempotent.
+    """
+
+    def __init__(self, path, fsync=True):
+        self.path = Path(path)
+        self.rotated_path = self.path.with_name(self.path.name + ".compacting")
+        self.fsync = fsync
+        self.pending = 0  # Edits appended since the last rotation
+        self._file = None
+        self._lock = threading.Lock()
+
+    def append(self, row, values):
+        """Records the new values of one row"""
+        entry = json.dumps({
+            "row": int(row),
+            "values": {column: _to_json_value(value) for column, value in values.items()},
+            "ts": time.time()
+        }, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(entry + "\n")
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.pending += 1
+
+    def rotate(self):
+        """Moves the live journal aside before a snapshot is written"""
+        with self._lock:
+            self._close()
+            if self.path.exists():
+                if self.rotated_path.exists():
+                    # A previous compaction failed; keep its edits in front of the new ones
+                    with open(self.rotated_path, 'a', encoding='utf-8') as rotated, \
+                            open(self.path, 'r', encoding='utf-8') as live:
+                        rotated.write(live.read())
+                    self.path.unlink()
+                else:
+                    os.replace(self.path, self.rotated_path)
+            self.pending = 0
+
+    def commit_rotation(self):
+        """Deletes the rotated journal once its edits are part of a snapshot"""
+        with self._lock:
+            if self.rotated_path.exists():
+                self.rotated_path.unlink()
+
+    def has_entries(self):
+        return self.rotated_path.exists() or self.path.exists()
+
+    def entries(self):
+        """Yields (row, values) for every journaled edit, oldest first"""
+        for path in (self.rotated_path, self.path):
+            if not path.exists():
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        row, values = entry["row"], entry["values"]
+                    except (json.JSONDecodeError, KeyError):
+                        # The last line may be cut short by a crash
+                        continue
+                    yield row, values
+
+    def replay(self, df):
+        """Applies all journaled edits to df in order and returns how many were applied"""
+        applied = 0
+        for row, values in self.entries():
+            for column, value in values.items():
+                df.at[row, column] = value
+            applied += 1
+        return applied
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _to_json_value(value):
+    if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+        return None
+    if hasattr(value, "item"):
+        # NumPy scalars
+        return value.item()
+    return value
@@ -1,9 +1,255 @@
 from openai import OpenAI
+import httpx
 import json
+import math
 import os
+import time
+import threading
+from contextlib import contextmanager
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
-from constants import TN_GENAI_BASE_URL, TN_GENAI_TOKEN_URL
+from fannotate.cache import ResponseCache
+from fannotate.journal import AnnotationJournal
+from fannotate.ratelimit import BackendLimiter, backoff_delay, is_retryable, is_throttled
+from fannotate.constants import (
+    TN_GENAI_BASE_URL,
+    TN_GENAI_TOKEN_URL,
+    LLM_CACHE_PATH,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_MAX_AGE_DAYS,
+    LLM_POOL_MAX_CONNECTIONS
+)
+
+class TokenManager:
+    """
+    Caches the TN-GenAI client-credentials token until shortly before it
+    expires, and refreshes it in the background ahead of expiry.
+    """
+    def __init__(self, config, refresh_margin=60):
+        self.config = config
+        self.refresh_margin = refresh_margin  # Seconds before expiry a token is treated as stale
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def get_token(self):
+        """Returns a valid access token, fetching a new one only when needed"""
+        with self._lock:
+            if self._token is None or time.time() >= self._expires_at - self.refresh_margin:
+                self._fetch_token()
+            return self._token
+
+    def invalidate(self, token=None):
+        """Drops the cached token, e.g. after a 401. Only drops it if it is still the given token"""
+        with self._lock:
+            if token is None or token == self._token:
+                self._token = None
+                self._expires_at = 0.0
+
+    def _fetch_token(self):
+        # Must be called with self._lock held
+        response = requests.post(
+            self.config.token_url,
+            data={
+                "grant_type": "client_credentials"
+            },
+            auth = HTTPBasicAuth(self.config.api_client_id, self.config.api_client_secret)
+        )
+        response.raise_for_status()
+        data = response.json()
+        expires_in = float(data.get("expires_in", 3600))
+        self._token = data["access_token"]
+        self._expires_at = time.time() + expires_in
+        self._schedule_refresh(expires_in)
+
+    def _schedule_refresh(self, expires_in):
+        if self._timer is not None:
+            self._timer.cancel()
+        # Refresh well before get_token would have to block on a new token
+        delay = max(expires_in - 2 * self.refresh_margin, expires_in / 2, 1.0)
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        try:
+            with self._lock:
+                self._fetch_token()
+        except Exception as e:
+            # get_token will retry synchronously once the token is stale
+            print(f"Error refreshing access token: {e}")
+
+class ClientRegistry:
+    """
+    Keeps long-lived OpenAI clients and requests sessions keyed by
+    (framework, base_url, api_key), so connections are reused across calls.
+    """
+    def __init__(self, max_connections=64, max_keepalive_connections=32):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self._clients = {}
+        self._sessions = {}
+        self._in_use = 0     # Batches and requests that may still hold a client
+        self._retired = []   # Clients and sessions dropped by clear(), closed once nothing uses them
+        self._lock = threading.Lock()
+
+    def openai_client(self, framework, base_url, api_key):
+        """Returns the pooled OpenAI client for the endpoint, creating it on first use"""
+        key = (framework, base_url, api_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_keepalive_connections
+                    ),
+                    timeout=httpx.Timeout(600.0, connect=10.0)
+                )
+                # Retries are handled by _send_with_backoff, which also tracks throttling
+                client = OpenAI(base_url=base_url, api_key=api_key, http_client=http_client, max_retries=0)
+                self._clients[key] = client
+            return client
+
+    def session(self, framework, base_url, api_key=None):
+        """Returns the pooled requests.Session for the endpoint, creating it on first use"""
+        key = (framework, base_url, api_key)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_connections)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[key] = session
+            return session
+
+    def set_limits(self, max_connections=None, max_keepalive_connections=None):
+        """Updates the pool limits. Existing clients are dropped so the new limits apply"""
+        if max_connections is not None:
+            self.max_connections = max(1, max_connections)
+        if max_keepalive_connections is not None:
+            self.max_keepalive_connections = max(0, max_keepalive_connections)
+        self.clear()
+
+    def clear(self):
+        """
+        Forgets all pooled clients and sessions, so the next call creates new ones. The old
+        ones are closed once no batch or request is using them anymore
+        """
+        with self._lock:
+            self._retired += list(self._clients.values()) + list(self._sessions.values())
+            self._clients = {}
+            self._sessions = {}
+            retired = self._take_retired()
+        self._close(retired)
+
+    @contextmanager
+    def in_use(self):
+        """Marks work that holds on to clients, e.g. a batch that fetched its client up front"""
+        with self._lock:
+            self._in_use += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                retired = self._take_retired()
+            self._close(retired)
+
+    def _take_retired(self):
+        # Must be called with self._lock held
+        if self._in_use:
+            return []
+        retired, self._retired = self._retired, []
+        return retired
+
+    @staticmethod
+    def _close(retired):
+        for client in retired:
+            try:
+                client.close()
+            except Exception as e:
+                print(f"Error closing LLM client: {e}")
+
+class BatchProgress:
+    """
+    Live counters for a running batch. The batch updates them from its own
+    thread while the UI polls summary(); cancel() stops new requests from being sent.
+    Counts are per request, i.e. per (row, output column) pair.
+    """
+    def __init__(self):
+        self.total = 0
+        self.done = 0
+        self.errors = 0
+        self.skipped = 0
+        self.columns = {}  # output column -> {"total", "done", "errors"}
+        self.started_at = time.time()
+        self.finished = False
+        self._cancel_event = threading.Event()
+        self._cache_start = None
+
+    def start(self, totals, skipped=0):
+        """Starts the clock. totals maps each output column to its number of pending requests"""
+        self.columns = {column: {"total": total, "done": 0, "errors": 0} for column, total in totals.items()}
+        self.total = sum(totals.values())
+        self.skipped = skipped
+        self.started_at = time.time()
+        self._cache_start = response_cache.stats()
+
+    def record(self, column, ok=True):
+        key = "done" if ok else "errors"
+        self.columns[column][key] += 1
+        if ok:
+            self.done += 1
+        else:
+            self.errors += 1
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cache_stats(self):
+        """Returns (hits, misses) of the response cache since the batch started"""
+        if self._cache_start is None:
+            return 0, 0
+        hits, misses = response_cache.stats()
+        return hits - self._cache_start[0], misses - self._cache_start[1]
+
+    def rows_per_second(self):
+        elapsed = time.time() - self.started_at
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def eta_seconds(self):
+        rate = self.rows_per_second()
+        if rate <= 0:
+            return None
+        return (self.total - self.done - self.errors) / rate
+
+    def summary(self):
+        """Formats the counters for the Auto-fill progress box"""
+        percent = 100 * (self.done + self.errors) / self.total if self.total else 0.0
+        eta = self.eta_seconds()
+        eta_text = f"{int(eta // 60)}m {int(eta % 60)}s" if eta is not None else "-"
+        hits, misses = self.cache_stats()
+        lines = [
+            f"Requests done: {self.done + self.errors}/{self.total} ({percent:.1f}%), skipped {self.skipped} already filled",
+            f"Throughput: {self.rows_per_second():.2f} requests/s, ETA: {eta_text}",
+            f"Errors: {self.errors}",
+            f"LLM cache: {hits} hits, {misses} misses"
+        ]
+        if len(self.columns) > 1:
+            for column, counts in self.columns.items():
+                lines.append(f"  {column}: {counts['done'] + counts['errors']}/{counts['total']} ({counts['errors']} errors)")
+        if self.cancelled and not self.finished:
+            lines.append("Cancelling: waiting for requests in flight...")
+        return "\n".join(lines)
 
 class LLMConfig:
     def __init__(self):
@@ -14,6 +260,10 @@ class LLMConfig:
         self.max_tokens = 500    # Default max tokens
         self.temperature = 0.0   # Default temperature
         self.max_transcript_length = 500  # Default max transcript length in characters
+        self.max_concurrency = 8  # Max requests in flight during batch processing
+        self.max_retries = 4      # Retries per request, with exponential backoff, before it fails
+        self.requests_per_minute = 0  # Request rate limit per backend (0 = no limit)
+        self.tokens_per_minute = 0    # Estimated token rate limit per backend (0 = no limit)
         # PrivateGPT specific configs
         self.chat_id = None      # For PrivateGPT chat history
         self.history_size = 10   # Default history size for PrivateGPT
@@ -24,10 +274,12 @@ class LLMConfig:
         self.api_client_id = os.getenv("GENAI_API_CLIENT_KEY")
         self.api_client_secret = os.getenv("GENAI_API_CLIENT_SECRET")
         self.genai_api_base_url = TN_GENAI_BASE_URL
+        self.token_manager = TokenManager(self)
 
     def update_config(self, framework=None, base_url=None, api_key=None, model=None, 
                      max_tokens=None, temperature=None, chat_id=None, history_size=None, 
-                     agent_id=None, max_transcript_length=None):
+                     agent_id=None, max_transcript_length=None, max_concurrency=None,
+                     max_retries=None, requests_per_minute=None, tokens_per_minute=None):
         if framework:
             self.framework = framework
         if base_url:
@@ -48,8 +300,23 @@ class LLMConfig:
             self.agent_id = agent_id
         if max_transcript_length is not None:
             self.max_transcript_length = max_transcript_length
+        if max_concurrency is not None:
+            self.max_concurrency = max(1, max_concurrency)
+        if max_retries is not None:
+            self.max_retries = max(0, max_retries)
+        if requests_per_minute is not None:
+            self.requests_per_minute = max(0, requests_per_minute)
+        if tokens_per_minute is not None:
+            self.tokens_per_minute = max(0, tokens_per_minute)
 
 config = LLMConfig()
+clients = ClientRegistry(max_connections=LLM_POOL_MAX_CONNECTIONS)
+limiters = {}  # framework -> BackendLimiter
+response_cache = ResponseCache(
+    LLM_CACHE_PATH,
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    max_age_days=LLM_CACHE_MAX_AGE_DAYS
+)
 
 def update_llm_config(
     framework=None,
@@ -60,8 +327,14 @@ def update_llm_config(
     temperature=None,
     chat_id=None,
     history_size=None,
-    max_transcript_length=None
+    max_transcript_length=None,
+    max_concurrency=None,
+    max_retries=None,
+    max_connections=None,
+    requests_per_minute=None,
+    tokens_per_minute=None
 ):
+    endpoint = (config.framework, config.base_url, config.api_key)
     config.update_config(
         framework=framework,
         base_url=base_url,
@@ -71,15 +344,88 @@ def update_llm_config(
         temperature=temperature,
         chat_id=chat_id,
         history_size=history_size,
-        max_transcript_length=max_transcript_length
+        max_transcript_length=max_transcript_length,
+        max_concurrency=max_concurrency,
+        max_retries=max_retries,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute
     )
+    _backend_limiter().configure(
+        requests_per_minute=config.requests_per_minute,
+        tokens_per_minute=config.tokens_per_minute,
+        max_concurrency=config.max_concurrency
+    )
+    if max_connections is None and config.max_concurrency > clients.max_connections:
+        # Keep enough pooled connections for every request in flight
+        max_connections = config.max_concurrency
+    if max_connections is not None:
+        clients.set_limits(max_connections=max_connections)
+    elif endpoint != (config.framework, config.base_url, config.api_key):
+        # Release connections to the old endpoint
+        clients.clear()
+
+def _backend_limiter():
+    """Returns the rate limiter of the current framework, creating it on first use"""
+    limiter = limiters.get(config.framework)
+    if limiter is None:
+        limiter = limiters.setdefault(config.framework, BackendLimiter(
+            requests_per_minute=config.requests_per_minute,
+            tokens_per_minute=config.tokens_per_minute,
+            max_concurrency=config.max_concurrency
+        ))
+    return limiter
+
+def _openai_client():
+    """Returns the pooled OpenAI client for the current configuration"""
+    base_url = config.base_url if config.framework == "vLLM" else "https://api.openai.com/v1/"
+    return clients.openai_client(config.framework, base_url, config.api_key)
+
+def _genai_session():
+    """Returns the pooled requests session for the TN-GenAI gateway"""
+    return clients.session(config.framework, config.genai_api_base_url)
+
+def _cached_response(prompt, values, temperature, max_tokens, request_fn, schema=None, logprobs=False):
+    """Returns the cached response for a request, or runs request_fn and caches its result"""
+    key = ResponseCache.make_key(
+        config.framework, config.model, prompt, values, temperature, max_tokens, schema, logprobs
+    )
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached
+    response = _send_with_backoff(request_fn, prompt, max_tokens)
+    response_cache.put(key, response)
+    return response
+
+def _send_with_backoff(request_fn, prompt, max_tokens=None):
+    """
+    Sends a request through the backend's rate limiter. Throttling, server errors
+    and invalid responses are retried with exponential backoff and jitter,
+    honouring Retry-After when the server sends it.
+    """
+    limiter = _backend_limiter()
+    # Rough token estimate: ~4 characters per token plus the completion budget
+    estimated_tokens = len(prompt) // 4 + (max_tokens or 50)
+    attempt = 0
+    while True:
+        limiter.acquire(estimated_tokens)
+        try:
+            with clients.in_use():
+                response = request_fn()
+        except Exception as e:
+            limiter.release(success=False, throttled=is_throttled(e))
+            if attempt >= config.max_retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, e)
+            attempt += 1
+            print(f"Retrying request in {delay:.1f}s after error ({attempt}/{config.max_retries}): {e}")
+            time.sleep(delay)
+            continue
+        limiter.release(success=True)
+        return response
 
 def query_llm(instruction):
-    try:
-        client = OpenAI(
-            base_url=config.base_url if config.framework == "vLLM" else "https://api.openai.com/v1/",
-            api_key=config.api_key
-        )
+    def request():
+        client = _openai_client()
 
         completion = client.chat.completions.create(
             model=config.model,
@@ -90,84 +436,100 @@ def query_llm(instruction):
             ]
         )
         return completion.choices[0].message.content
+
+    try:
+        return _cached_response(instruction, None, 0.0, None, request)
     except Exception as e:
         return f"Error querying LLM: {str(e)}"
 
+def _request_settings(values, schema=None):
+    """Returns the (temperature, max_tokens) actually sent for a request, used in cache keys"""
+    if config.framework == "vLLM":
+        return config.temperature, None if values and not schema else config.max_tokens
+    if config.framework == "OpenAI":
+        return None, 50 if values and not schema else config.max_tokens
+    return None, None
+
 def query_constrained_llm(instruction, values):
+    temperature, max_tokens = _request_settings(values)
     try:
-        print(f"Current framework: {config.framework}")  # Debug line
-        
-        if config.framework == "TN-GenAI-V1":
-            # PrivateGPT specific implementation
-
-            token = requests.post(
-                config.token_url,
-                data={
-                    "grant_type": "client_credentials"
-                },
-                auth = HTTPBasicAuth(config.api_client_id, config.api_client_secret)
-            ).json()["access_token"]
-            
-            values_str = ", ".join(values)
-            modified_instruction = f"{instruction}\n\nYou must choose exactly one of these options: {values_str}"
-            
-            payload = {
-                "message": modified_instruction,
-                #"history_size": config.history_size,
-                "model": config.model,
-                #"seed": 1337
-            }
-            
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            }
-            
-            response = requests.post(
-                f"{config.genai_api_base_url}/chat",
-                json=payload,
-                headers=headers
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            return data["response"]
-            
-        elif config.framework == "vLLM":
-            client = OpenAI(
-                base_url=config.base_url if config.framework == "vLLM" else "https://api.openai.com/v1/",
-                api_key=config.api_key
-            )
-            
-            print("Using vLLM framework")  # Debug line
-            completion = client.chat.completions.create(
-                model=config.model,
-                messages=[
-                    {"role": "user", "content": instruction}
-                ],
-                extra_body={
-                    "guided_choice": values
-                }
-            )
-        else:
-            print("Using OpenAI framework")  # Debug line
-            values_str = ", ".join(values)
-            modified_instruction = f"{instruction}\n\nYou must choose exactly one of these options: {values_str}"
-            
-            # Remove temperature for OpenAI calls
-            completion = client.chat.completions.create(
-                model=config.model,
-                messages=[
-                    {"role": "system", "content": "You must respond with exactly one of the allowed values, nothing else."},
-                    {"role": "user", "content": modified_instruction}
-                ],
-                max_tokens=50
-            )
-            
-        return completion.choices[0].message.content
+        return _cached_response(
+            instruction, values, temperature, max_tokens,
+            lambda: _query_constrained_llm(instruction, values)
+        )
     except Exception as e:
         return f"Error querying LLM: {str(e)}"
 
+def _query_constrained_llm(instruction, values):
+    print(f"Current framework: {config.framework}")  # Debug line
+
+    if config.framework == "TN-GenAI-V1":
+        # PrivateGPT specific implementation
+        values_str = ", ".join(values)
+        modified_instruction = f"{instruction}\n\nYou must choose exactly one of these options: {values_str}"
+        
+        payload = {
+            "message": modified_instruction,
+            #"history_size": config.history_size,
+            "model": config.model,
+            #"seed": 1337
+        }
+        
+        return _post_genai_chat(payload)
+        
+    client = _openai_client()
+    if config.framework == "vLLM":
+        print("Using vLLM framework")  # Debug line
+        completion = client.chat.completions.create(
+            model=config.model,
+            messages=[
+                {"role": "user", "content": instruction}
+            ],
+            seed=1337,
+            temperature=config.temperature,
+            extra_body={
+                "guided_choice": values
+            }
+        )
+    else:
+        print("Using OpenAI framework")  # Debug line
+        values_str = ", ".join(values)
+        modified_instruction = f"{instruction}\n\nYou must choose exactly one of these options: {values_str}"
+        
+        # Remove temperature for OpenAI calls
+        completion = client.chat.completions.create(
+            model=config.model,
+            messages=[
+                {"role": "system", "content": "You must respond with exactly one of the allowed values, nothing else."},
+                {"role": "user", "content": modified_instruction}
+            ],
+            max_tokens=50
+        )
+        
+    return completion.choices[0].message.content
+
+
+def _post_genai_chat(payload):
+    """POSTs a message to the TN-GenAI chat endpoint, retrying once with a fresh token on 401"""
+    for attempt in range(2):
+        token = config.token_manager.get_token()
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+        response = _genai_session().post(
+            f"{config.genai_api_base_url}/chat",
+            json=payload,
+            headers=headers
+        )
+        #prep_request = format_prepped_request(response.request, "utf8")
+        #print(prep_request)
+        if response.status_code == 401 and attempt == 0:
+            config.token_manager.invalidate(token)
+            continue
+        response.raise_for_status()
+        return response.json()["response"]
+
 
 # Troubleshooting method
 def format_prepped_request(prepped, encoding=None):
@@ -182,108 +544,391 @@ def format_prepped_request(prepped, encoding=None):
 {body}"""
 
 
-def batch_process_transcripts(df, instruction, column_name, output_column, values=None):
+def _process_transcript(client, transcript, instruction, values=None, schema=None):
+    """
+    Returns the response for a single transcript, served from the response cache
+    when possible. With a JSON schema the parsed JSON object is returned instead, and
+    with values on a backend that reports log-probabilities a dict with the "answer"
+    and its "confidence".
+    """
+    prompt = instruction.replace('<<text>>', transcript)
+    temperature, max_tokens = _request_settings(values, schema)
+    if schema:
+        response = _cached_response(
+            prompt, None, temperature, max_tokens,
+            lambda: _request_json(client, prompt, schema),
+            schema=schema
+        )
+        return json.loads(response)
+    if values and _reports_logprobs():
+        response = _cached_response(
+            prompt, values, temperature, max_tokens,
+            lambda: _request_choice(client, prompt, values),
+            logprobs=True
+        )
+        return json.loads(response)
+    return _cached_response(
+        prompt, values, temperature, max_tokens,
+        lambda: _request_transcript(client, prompt, values)
+    )
+
+
+def _request_transcript(client, prompt, values=None):
+    """Sends a single prompt to the configured framework and returns the response text"""
+    if config.framework == "TN-GenAI-V1":
+        payload = {
+            #"chat_id": config.chat_id,
+            "message": prompt,
+            #"history_size": config.history_size,
+            "model": config.model,
+            #"seed": 1337
+        }
+
+        if values:
+            # Add constrained options to the prompt
+            values_str = ", ".join(values)
+            payload["message"] = f"{prompt}\n\nPlease choose exactly one of these options: {values_str}"
+
+        return _post_genai_chat(payload)
+
+    if values:
+        completion = _choice_completion(client, prompt, values)
+    else:
+        # For unconstrained responses
+        extra_args = {"seed": 1337, "temperature": config.temperature} if config.framework == "vLLM" else {}
+        completion = client.chat.completions.create(
+            model=config.model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=config.max_tokens,
+            **extra_args
+        )
+
+    return completion.choices[0].message.content
+
+
+def _reports_logprobs():
+    """Whether the configured backend returns token log-probabilities"""
+    return config.framework in ("vLLM", "OpenAI")
+
+
+def _choice_completion(client, prompt, values, logprobs=False):
+    """Asks an OpenAI-compatible backend to answer with one of the values"""
+    extra_args = {"logprobs": True} if logprobs else {}
+    if config.framework == "vLLM":
+        return client.chat.completions.create(
+            model=config.model,
+            messages=[{"role": "user", "content": prompt}],
+            seed=1337,
+            temperature=config.temperature,
+            extra_body={"guided_choice": values},
+            **extra_args
+        )
+    # For OpenAI models
+    values_str = ", ".join(values)
+    modified_prompt = f"{prompt}\n\nPlease choose exactly one of these options: {values_str}"
+    return client.chat.completions.create(
+        model=config.model,
+        messages=[
+            {"role": "system", "content": "You must respond with exactly one of the allowed values, nothing else."},
+            {"role": "user", "content": modified_prompt}
+        ],
+        max_tokens=50,
+        **extra_args
+    )
+
+
+def _request_choice(client, prompt, values):
+    """
+    Requests one of the values with log-probabilities and returns JSON text with the
+    answer and its confidence: the probability the model gave the answer's tokens,
+    or None if the backend left the log-probabilities out
+    """
+    choice = _choice_completion(client, prompt, values, logprobs=True).choices[0]
+    tokens = choice.logprobs.content if choice.logprobs is not None else None
+    confidence = round(math.exp(sum(token.logprob for token in tokens)), 6) if tokens else None
+    return json.dumps({"answer": choice.message.content, "confidence": confidence}, ensure_ascii=False)
+
+
+def _parse_json_object(content):
+    """Extracts the JSON object from a model response, tolerating code fences and extra text"""
+    start = content.find('{')
+    end = content.rfind('}')
+    if start == -1 or end < start:
+        raise ValueError(f"No JSON object in response: {content[:200]}")
+    parsed = json.loads(content[start:end + 1])
+    if not isinstance(parsed, dict):
+        raise ValueError("Response is not a JSON object")
+    return parsed
+
+
+def _request_json(client, prompt, schema):
+    """Requests a JSON object following the schema and returns it as validated JSON text"""
+    if config.framework == "TN-GenAI-V1":
+        # No structured output support; describe the schema in the prompt instead
+        payload = {
+            "message": f"{prompt}\n\nRespond only with a JSON object that follows this JSON schema:\n"
+                       f"{json.dumps(schema, ensure_ascii=False)}",
+            "model": config.model,
+        }
+        content = _post_genai_chat(payload)
+    else:
+        if config.framework == "vLLM":
+            extra_args = {
+                "seed": 1337,
+                "temperature": config.temperature,
+                "extra_body": {"guided_json": schema}
+            }
+        else:
+            extra_args = {
+                "response_format": {
+                    "type": "json_schema",
+                    "json_schema": {"name": "annotation", "schema": schema, "strict": True}
+                }
+            }
+        completion = client.chat.completions.create(
+            model=config.model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=config.max_tokens,
+            **extra_args
+        )
+        content = completion.choices[0].message.content
+
+    # Validate before the response is cached
+    return json.dumps(_parse_json_object(content), ensure_ascii=False)
+
+
+def _load_checkpoint(checkpoint_path):
+    """Reads an auto-fill checkpoint journal into a {row label: {column: value}} dict"""
+    completed = {}
+    if checkpoint_path is None or not os.path.exists(checkpoint_path):
+        return completed
+    for row, values in AnnotationJournal(checkpoint_path).entries():
+        completed.setdefault(row, {}).update(values)
+    return completed
+
+
+def batch_process_transcripts(df, instruction, column_name, output_column, values=None,
+                              checkpoint_path=None, resume=True, progress=None, writer=None):
+    """
+    Runs the instruction over every transcript with up to config.max_concurrency
+    requests in flight. Each finished row is written into df[output_column] and
+    appended to the checkpoint journal as soon as it completes. With resume=True,
+    rows that already have a value (in the dataframe or the journal) are skipped.
+    Pass a BatchProgress to follow the batch from another thread or to cancel it.
+    """
+    task = {
+        "instruction": instruction,
+        "output_column": output_column,
+        "values": values,
+        "checkpoint_path": checkpoint_path
+    }
+    return batch_process_tasks(df, [task], resume=resume, progress=progress, writer=writer)
+
+
+def _task_columns(task):
+    """Returns {response key: dataframe column} for a task; plain tasks use the key None"""
+    if task.get("output_columns"):
+        return task["output_columns"]
+    return {None: task["output_column"]}
+
+
+def _confidence_column(output_column):
+    return f"{output_column}_confidence"
+
+
+def _result_cells(columns, result):
+    """
+    Returns {column: value} for one response, fanning a JSON response out over several
+    columns. A categorical answer with a confidence also fills the confidence column.
+    """
+    if None in columns:
+        if isinstance(result, dict):
+            return {columns[None]: result["answer"], _confidence_column(columns[None]): result["confidence"]}
+        return {columns[None]: result}
+    cells = {}
+    for key, column in columns.items():
+        value = result.get(key) if isinstance(result, dict) else None
+        cells[column] = value if value is None or isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    return cells
+
+
+def _empty_cells(df, columns):
+    """Returns {row: [empty columns]} for the rows where any of the columns is empty"""
+    empty = df[columns].isna()
+    rows = empty.index[empty.any(axis=1)]
+    if len(columns) == 1:
+        return {row: columns for row in rows}
+    flags = empty.loc[rows].to_numpy()
+    return {row: [column for column, is_empty in zip(columns, row_flags) if is_empty]
+            for row, row_flags in zip(rows, flags)}
+
+
+def _cells_to_fill(df, cells, columns):
+    """
+    Keeps the cells of the given (empty) label columns and their confidence columns.
+    A label written without a confidence clears the old one, so a confidence never
+    belongs to an earlier label.
+    """
+    allowed = set(columns) | {_confidence_column(column) for column in columns}
+    kept = {column: value for column, value in cells.items() if column in allowed}
+    for column in columns:
+        confidence = _confidence_column(column)
+        if column in kept and confidence not in kept and confidence in df.columns:
+            kept[confidence] = None
+    return kept
+
+
+class _FrameWriter:
+    """Stores batch results straight in a dataframe; the annotator passes an AutofillWriter instead"""
+
+    def __init__(self, df):
+        self.df = df
+
+    def add_columns(self, columns, clear=False):
+        for column in columns:
+            if clear or column not in self.df.columns:
+                self.df[column] = None
+
+    def write_cells(self, row, values):
+        for column, value in values.items():
+            self.df.at[row, column] = value
+
+
+def batch_process_tasks(df, tasks, resume=True, progress=None, writer=None):
+    """
+    Runs several instructions over every transcript through one shared work queue.
+    Each task is a dict with "instruction", "output_column" and optionally "values"
+    and "checkpoint_path". A task can instead give a JSON "schema" and an
+    "output_columns" dict mapping response keys to columns, in which case one
+    request per row fills all of those columns. Requests are scheduled row by
+    row, so all tasks for a transcript are in flight together, while each task
+    keeps its own fixed instruction prefix that the server's prefix cache can
+    reuse across rows.
+
+    Results are stored through writer, an object with add_columns(columns, clear)
+    and write_cells(row, values) such as annotator.autofill_writer(); by default
+    they are written straight into df.
+    """
+    if writer is None:
+        writer = _FrameWriter(df)
+    # Clients replaced by a settings change while the batch runs stay open until it ends
+    with clients.in_use():
+        return _run_batch(df, tasks, resume, progress, writer)
+
+
+def _run_batch(df, tasks, resume, progress, writer):
     prep_request = None
+    if progress is None:
+        progress = BatchProgress()
     try:
+        client = None
         if config.framework == "TN-GenAI-V1":
-
-            token = requests.post(
-                config.token_url,
-                data={
-                    "grant_type": "client_credentials"
-                },
-                auth = HTTPBasicAuth(config.api_client_id, config.api_client_secret)
-            ).json()["access_token"]
-            
-            results = []
-            for idx, row in df.iterrows():
-                transcript = str(row['text'])[:config.max_transcript_length]
-                prompt = instruction.replace('<<text>>', transcript)
-                
-                payload = {
-                    #"chat_id": config.chat_id,
-                    "message": prompt,
-                    #"history_size": config.history_size,
-                    "model": config.model,
-                    #"seed": 1337
-                }
-                
-                if values:
-                    # Add constrained options to the prompt
-                    values_str = ", ".join(values)
-                    payload["message"] = f"{prompt}\n\nPlease choose exactly one of these options: {values_str}"
-                
-                headers = {
-                    "Authorization": f"Bearer {token}",
-                    "Content-Type": "application/json"
-                }
-                
-                response = requests.post(
-                    f"{config.genai_api_base_url}/chat",
-                    json=payload,
-                    headers=headers
-                )
-                #prep_request = format_prepped_request(response.request, "utf8")
-                #print(prep_request)
-                response.raise_for_status()
-                data = response.json()
-                
-                results.append(data["response"])
-                
-            df[output_column] = results
-            return df, "Processing completed successfully"
-            
+            # Fail fast on bad credentials; the token is cached for the rows
+            config.token_manager.get_token()
         else:
-            client = OpenAI(
-                base_url=config.base_url if config.framework == "vLLM" else "https://api.openai.com/v1/",
-                api_key=config.api_key
-            )
-            
+            client = _openai_client()
+
+        pending = {}
+        skipped = 0
+        for task in tasks:
+            values = task.get("values")
             # Convert comma-separated string to list and strip whitespace
             if values and isinstance(values, str):
-                values = [v.strip() for v in values.split(',')]
-            
-            results = []
-            for idx, row in df.iterrows():
-                transcript = str(row['text'])[:config.max_transcript_length]
-                # Replace <<text>> tag with actual transcript
-                prompt = instruction.replace('<<text>>', transcript)
-                
-                if values:
-                    if config.framework == "vLLM":
-                        completion = client.chat.completions.create(
-                            model=config.model,
-                            messages=[{"role": "user", "content": prompt}],
-                            extra_body={"guided_choice": values}
-                        )
-                    else:
-                        # For OpenAI models
-                        values_str = ", ".join(values)
-                        modified_prompt = f"{prompt}\n\nPlease choose exactly one of these options: {values_str}"
-                        completion = client.chat.completions.create(
-                            model=config.model,
-                            messages=[
-                                {"role": "system", "content": "You must respond with exactly one of the allowed values, nothing else."},
-                                {"role": "user", "content": modified_prompt}
-                            ],
-                            max_tokens=50
-                        )
-                else:
-                    # For unconstrained responses
-                    completion = client.chat.completions.create(
-                        model=config.model,
-                        messages=[{"role": "user", "content": prompt}],
-                        max_tokens=500  # Add reasonable max_tokens limit for unconstrained responses
-                    )
-                
-                results.append(completion.choices[0].message.content)
-                
-            # Update DataFrame with results
-            df[output_column] = results
-            return df, "Processing completed successfully"
-            
+                task["values"] = [v.strip() for v in values.split(',')]
+
+            columns = _task_columns(task)
+            task.setdefault("name", ", ".join(columns.values()))
+            checkpoint_path = task.get("checkpoint_path")
+            label_columns = list(columns.values())
+            result_columns = list(label_columns)
+            if task.get("values") and not task.get("schema") and _reports_logprobs():
+                result_columns.append(_confidence_column(task["output_column"]))
+            # Confidence columns of earlier runs are reset together with their labels
+            result_columns += [column for column in map(_confidence_column, label_columns)
+                               if column in df.columns and column not in result_columns]
+            if not resume:
+                writer.add_columns(result_columns, clear=True)
+                if checkpoint_path is not None and os.path.exists(checkpoint_path):
+                    os.remove(checkpoint_path)
+            else:
+                writer.add_columns(result_columns)
+                # Recover rows finished by an earlier, interrupted run
+                completed = _load_checkpoint(checkpoint_path)
+                if completed:
+                    empty = _empty_cells(df, label_columns)
+                    for row, cells in completed.items():
+                        if row in empty:
+                            writer.write_cells(row, _cells_to_fill(df, cells, empty[row]))
+
+            # Only cells empty now are written, so a row asked again for one attribute keeps the others
+            pending[task["name"]] = _empty_cells(df, label_columns)
+            skipped += len(df) - len(pending[task["name"]])
+
+        work = [
+            (row, task)
+            for row in df.index
+            for task in tasks
+            if row in pending[task["name"]]
+        ]
+        progress.start({name: len(rows) for name, rows in pending.items()}, skipped)
+        cancelled = False
+        failed = 0
+
+        # Checkpoints use the edit journal format, so loading the same data later can replay them
+        journals = {
+            task["name"]: AnnotationJournal(task["checkpoint_path"], fsync=False)
+            for task in tasks
+            if task.get("checkpoint_path") is not None
+        }
+        executor = ThreadPoolExecutor(max_workers=config.max_concurrency)
+        try:
+            futures = {
+                executor.submit(
+                    _process_transcript,
+                    client,
+                    str(df.at[row, 'text'])[:config.max_transcript_length],
+                    task["instruction"],
+                    task.get("values"),
+                    task.get("schema")
+                ): (row, task)
+                for row, task in work
+            }
+            for future in as_completed(futures):
+                if progress.cancelled and not cancelled:
+                    # Stop sending new requests; requests already in flight still finish
+                    cancelled = True
+                    for pending_future in futures:
+                        pending_future.cancel()
+                if future.cancelled():
+                    continue
+                row, task = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # Leave the row empty so the next run retries it
+                    print(f"Error processing row {row} for {task['name']}: {e}")
+                    failed += 1
+                    progress.record(task["name"], ok=False)
+                    continue
+                cells = _cells_to_fill(df, _result_cells(_task_columns(task), result), pending[task["name"]][row])
+                writer.write_cells(row, cells)
+                journal = journals.get(task["name"])
+                if journal is not None:
+                    journal.append(row, cells)
+                progress.record(task["name"])
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            for journal in journals.values():
+                journal.close()
+            progress.finished = True
+
+        summary = f"Processed {progress.done} requests, skipped {skipped} already filled"
+        if cancelled:
+            return df, f"Cancelled. {summary}; the remaining {len(work) - progress.done} requests are left empty"
+        if failed:
+            return df, f"{summary}. {failed} requests failed and were left empty; run auto-fill again to retry them"
+        return df, f"Processing completed successfully. {summary}"
+
     except Exception as e:
         print(f"Error in batch processing: {e}. Request sent was:\n{prep_request}")
         return None, f"Error in batch processing: {str(e)} Request sent was:\n{prep_request}"
-
-    return None, f"Error in batch processing: {str(e)}"
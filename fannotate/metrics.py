@@ -0,0 +1,154 @@
+"""
+Agreement metrics between model and human annotations, computed with NumPy on
+integer-coded labels, and a small cache so results are only recomputed when the
+annotation table changes.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+
+class ResultCache:
+    """Thread-safe LRU cache for analysis results, keyed by e.g. (category, table version)"""
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._pending = {}  # Key -> future of a job that is still running
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, compute())
+        return value
+
+    def get_or_submit(self, key, compute, executor):
+        """
+        Returns a future for the value, running compute on the executor on a miss.
+        Requests for a key that is already being computed share the running job.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                future = Future()
+                future.set_result(self._entries[key])
+                return future
+            future = self._pending.get(key)
+            if future is None:
+                future = executor.submit(self._compute, key, compute)
+                self._pending[key] = future
+            return future
+
+    def _compute(self, key, compute):
+        try:
+            return self.put(key, compute())
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def comparison_pairs(df, auto_col, user_col):
+    """Returns (y_true, y_pred) for the rows where both the human and the model annotated"""
+    mask = df[auto_col].notna().to_numpy() & df[user_col].notna().to_numpy()
+    return df[user_col][mask], df[auto_col][mask]
+
+
+def categorical_agreement(y_true, y_pred):
+    """
+    Computes the confusion matrix, per-class precision/recall/F1, macro and weighted
+    F1, Cohen's kappa and the positions of disagreements in one pass over the labels.
+    Rows of the confusion matrix are human labels, columns are model labels.
+    """
+    true_values = np.asarray(y_true, dtype=object)
+    pred_values = np.asarray(y_pred, dtype=object)
+    n = len(true_values)
+
+    # Factorize both columns together so they share one label -> code mapping
+    codes, labels = pd.factorize(np.concatenate([true_values, pred_values]), sort=True)
+    true_codes, pred_codes = codes[:n], codes[n:]
+    k = len(labels)
+
+    confusion = np.bincount(true_codes * k + pred_codes, minlength=k * k).reshape(k, k)
+    correct = np.diag(confusion).astype(float)
+    support = confusion.sum(axis=1).astype(float)
+    predicted = confusion.sum(axis=0).astype(float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(predicted > 0, correct / predicted, 0.0)
+        recall = np.where(support > 0, correct / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    accuracy = correct.sum() / n if n else 0.0
+    expected = (support * predicted).sum() / (n * n) if n else 0.0
+    kappa = (accuracy - expected) / (1 - expected) if expected < 1 else 1.0
+
+    return {
+        "labels": list(labels),
+        "confusion": confusion,
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "support": support.astype(int),
+        "accuracy": accuracy,
+        "macro_f1": f1.mean() if k else 0.0,
+        "weighted_f1": (f1 * support).sum() / n if n else 0.0,
+        "kappa": kappa,
+        "samples": n,
+        # Positions (not index labels) of the pairs where model and human disagree
+        "disagreements": np.flatnonzero(true_codes != pred_codes),
+    }
+
+
+def disagreement_table(df, y_true, y_pred, positions, category_icons=None):
+    """Builds the disagreements table for the given positions in y_true/y_pred"""
+    index = y_true.index[positions]
+    model = y_pred.iloc[positions]
+    human = y_true.iloc[positions]
+    if category_icons is not None:
+        model = model.map(category_icons).fillna("") + " " + model.astype(str)
+        human = human.map(category_icons).fillna("") + " " + human.astype(str)
+    return pd.DataFrame({
+        'Original_Index': index,
+        'Text': df.loc[index, 'text'].to_numpy(),
+        'Model Annotation': model.to_numpy(),
+        'Human Annotation': human.to_numpy()
+    })
+
+
+def rouge_scores(y_true, y_pred, metrics=('rouge1', 'rouge2', 'rougeL')):
+    """Returns {metric: {'p', 'r', 'f': array of per-pair scores}}"""
+    from rouge_score import rouge_scorer
+
+    scorer = rouge_scorer.RougeScorer(list(metrics), use_stemmer=True)
+    pairs = [scorer.score(str(ref), str(pred)) for ref, pred in zip(y_true, y_pred)]
+    return {
+        metric: {
+            'p': np.fromiter((scores[metric].precision for scores in pairs), float, len(pairs)),
+            'r': np.fromiter((scores[metric].recall for scores in pairs), float, len(pairs)),
+            'f': np.fromiter((scores[metric].fmeasure for scores in pairs), float, len(pairs)),
+        }
+        for metric in metrics
+    }
@@ -0,0 +1,7 @@
+def clean_column_name(name):
+    """
+    Purpose: Sanitizes column names by removing special characters and spaces.
+    """
+    if isinstance(name, list):
+        name = "".join(name)
+    return name.strip().replace('[','').replace(']','').replace("'", '').replace(" ", '_')
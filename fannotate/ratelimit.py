@@ -0,0 +1,155 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Status codes worth retrying: throttling, timeouts and server-side errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+THROTTLE_STATUS_CODES = {429, 503}
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `per_minute` units per minute. 0 disables the limit"""
+
+    def __init__(self, per_minute=0):
+        self._lock = threading.Lock()
+        self.set_rate(per_minute)
+
+    def set_rate(self, per_minute):
+        with self._lock:
+            self.per_minute = max(0, per_minute or 0)
+            self.capacity = float(self.per_minute)
+            self.tokens = self.capacity
+            self.updated_at = time.monotonic()
+
+    def acquire(self, amount=1):
+        """Blocks until `amount` units are available and takes them"""
+        while True:
+            with self._lock:
+                if not self.per_minute:
+                    return
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.per_minute / 60.0)
+                self.updated_at = now
+                # A single request larger than the bucket is let through once the bucket is full
+                amount = min(amount, self.capacity)
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) * 60.0 / self.per_minute
+            time.sleep(min(wait, 1.0))
+
+
+class AdaptiveConcurrency:
+    """
+    Limits the number of requests in flight. The limit is halved when the backend
+    throttles us and grows back by one after a streak of successful requests.
+    """
+
+    def __init__(self, max_limit=8, cooldown=5.0):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.cooldown = cooldown  # Seconds between two decreases, so one error burst counts once
+        self.in_flight = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def set_max_limit(self, max_limit):
+        with self._condition:
+            self.max_limit = max(1, max_limit)
+            self.limit = min(self.limit, self.max_limit)
+            self._condition.notify_all()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, success=True, throttled=False):
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                self._successes = 0
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(1, self.limit // 2)
+                    self._last_decrease = now
+                    print(f"Backend is throttling, lowering concurrency to {self.limit}")
+            elif success:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+
+class BackendLimiter:
+    """Request/token rate limits and adaptive concurrency for one LLM backend"""
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, max_concurrency=8):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+
+    def configure(self, requests_per_minute=None, tokens_per_minute=None, max_concurrency=None):
+        if requests_per_minute is not None:
+            self.requests.set_rate(requests_per_minute)
+        if tokens_per_minute is not None:
+            self.tokens.set_rate(tokens_per_minute)
+        if max_concurrency is not None:
+            self.concurrency.set_max_limit(max_concurrency)
+
+    def acquire(self, estimated_tokens):
+        self.requests.acquire(1)
+        self.tokens.acquire(estimated_tokens)
+        self.concurrency.acquire()
+
+    def release(self, success=True, throttled=False):
+        self.concurrency.release(success, throttled)
+
+
+def error_status_code(error):
+    """Returns the HTTP status code carried by an OpenAI or requests exception, if any"""
+    status = getattr(error, "status_code", None)
+    if status is None and getattr(error, "response", None) is not None:
+        status = getattr(error.response, "status_code", None)
+    return status
+
+
+def retry_after_seconds(error):
+    """Reads the Retry-After header (seconds or HTTP date) from a failed response, if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    """Network errors and invalid responses have no status code and are retried as well"""
+    status = error_status_code(error)
+    return status is None or status in RETRYABLE_STATUS_CODES
+
+
+def is_throttled(error):
+    return error_status_code(error) in THROTTLE_STATUS_CODES
+
+
+def backoff_delay(attempt, error=None, base=1.0, cap=60.0):
+    """Exponential backoff with full jitter, unless the server told us how long to wait"""
+    retry_after = retry_after_seconds(error) if error is not None else None
+    if retry_after is not None:
+        return min(retry_after, cap * 5)
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,106 @@
+"""
+Active-learning order for human review: unreviewed rows are ranked by how much a
+human label is expected to tell about the model's agreement, so the metrics on the
+Analysis tab settle with fewer labels.
+"""
+import numpy as np
+import pandas as pd
+
+# Relative weight of each signal in the informativeness score
+SIGNAL_WEIGHTS = {
+    "error_rate": 2.0,   # How often humans corrected the predicted class so far
+    "rarity": 1.0,       # How rare the predicted class is among all predictions
+    "confidence": 1.0,   # One minus the lowest answer probability, from the autofill_*_confidence columns
+}
+
+# Each further row with the same combination of predicted classes counts for less,
+# so the first rows reviewed cover many different predictions
+DIVERSITY_PENALTY = 0.5
+
+
+def categorical_columns(df, codebook):
+    """Returns (autofill column, user column) pairs of the categorical attributes in the table"""
+    pairs = []
+    for attribute in codebook.attributes:
+        if codebook.attribute_type(attribute) != 'categorical':
+            continue
+        auto_col, user_col = codebook.columns_for(attribute)
+        if auto_col in df.columns:
+            pairs.append((auto_col, user_col))
+    return pairs
+
+
+def class_error_rate(predictions, labels, reviewed):
+    """
+    Per-row error rate of the predicted class among reviewed rows, with add-one
+    smoothing so classes without reviews start at 0.5
+    """
+    has_label = reviewed & predictions.notna()
+    if labels is not None:
+        has_label &= labels.notna()
+        wrong = (predictions[has_label].astype(str) != labels[has_label].astype(str))
+    else:
+        wrong = pd.Series(False, index=predictions.index[has_label])
+    per_class = (wrong.groupby(predictions[has_label]).sum() + 1) / (wrong.groupby(predictions[has_label]).size() + 2)
+    return predictions.map(per_class).fillna(0.5).where(predictions.notna())
+
+
+def class_rarity(predictions):
+    """Per-row rarity of the predicted class: 0 for the most common class, close to 1 for rare ones"""
+    frequencies = predictions.value_counts()
+    if frequencies.empty:
+        return pd.Series(np.nan, index=predictions.index)
+    return 1 - predictions.map(frequencies / frequencies.max())
+
+
+def informativeness(df, candidates, codebook):
+    """Returns the informativeness score (0 to 1) of the candidate rows"""
+    reviewed = df['is_reviewed'].fillna(False).astype(bool) if 'is_reviewed' in df.columns \
+        else pd.Series(False, index=df.index)
+
+    signals = {"error_rate": [], "rarity": []}
+    confidence_columns = []
+    for auto_col, user_col in categorical_columns(df, codebook):
+        predictions = df[auto_col]
+        labels = df[user_col] if user_col in df.columns else None
+        signals["error_rate"].append(class_error_rate(predictions, labels, reviewed)[candidates])
+        signals["rarity"].append(class_rarity(predictions)[candidates])
+        if f"{auto_col}_confidence" in df.columns:
+            confidence_columns.append(f"{auto_col}_confidence")
+
+    if confidence_columns:
+        # Written by auto-fill on backends that return log-probabilities
+        confidence = df.loc[candidates, confidence_columns].apply(pd.to_numeric, errors="coerce").min(axis=1)
+        signals["confidence"] = [1 - confidence.clip(0, 1)]
+
+    score = pd.Series(0.0, index=candidates)
+    total_weight = pd.Series(0.0, index=candidates)
+    for name, values in signals.items():
+        if not values:
+            continue
+        # Averaged over attributes; rows without a prediction do not count for the signal
+        signal = pd.concat(values, axis=1).mean(axis=1)
+        weight = SIGNAL_WEIGHTS[name]
+        score += signal.fillna(0) * weight
+        total_weight += signal.notna() * weight
+    return (score / total_weight.where(total_weight > 0)).fillna(0)
+
+
+def informative_order(df, candidates, codebook):
+    """Orders candidate rows by informativeness, spread over different predicted label combinations"""
+    pairs = categorical_columns(df, codebook)
+    if not pairs:
+        return candidates
+
+    score = informativeness(df, candidates, codebook)
+    ranked = score.sort_values(ascending=False, kind="stable")
+    # Number each combination of predicted classes, without building strings per row
+    profiles = np.zeros(len(ranked), dtype=np.int64)
+    for auto_col, _ in pairs:
+        codes, uniques = pd.factorize(df.loc[ranked.index, auto_col])
+        profiles = pd.factorize(profiles * (len(uniques) + 1) + (codes + 1))[0]
+    profiles = pd.Series(profiles, index=ranked.index)
+    # Position of each row among the rows with the same predictions, best first
+    repeats = profiles.groupby(profiles, sort=False).cumcount()
+    ranked = (ranked / (1 + DIVERSITY_PENALTY * repeats)).sort_values(ascending=False, kind="stable")
+    return ranked.index
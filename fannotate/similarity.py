@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from fannotate.constants import (
+    BERTSCORE_MODEL,
+    BERTSCORE_BATCH_SIZE,
+    BERTSCORE_NUM_THREADS,
+    BERTSCORE_CACHE_MAX_PAIRS,
+    BERTSCORE_WARMUP
+)
+
+
+class BertScoreService:
+    """
+    Process-wide BERTScore scorer. The model is loaded once, on first use or by a
+    background warmup, and per-(candidate, reference) scores are memoized so that
+    after new annotations only the new pairs are scored. Scores are computed without
+    IDF weighting, so a pair's score does not depend on the other pairs.
+    """
+
+    def __init__(self, model_type="bert-base-uncased", batch_size=64, num_threads=0, max_pairs=200000):
+        self.model_type = model_type
+        self.batch_size = batch_size
+        self.num_threads = num_threads  # 0 keeps torch's default
+        self.max_pairs = max_pairs
+        self._scorer = None
+        self._scores = OrderedDict()  # (candidate, reference) -> (P, R, F1)
+        self._load_lock = threading.Lock()
+        self._score_lock = threading.Lock()  # One inference at a time; torch already uses all threads
+        self._cache_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._scorer is not None
+
+    def get_scorer(self):
+        """Returns the shared BERTScorer, loading the model on first use"""
+        if self._scorer is None:
+            with self._load_lock:
+                if self._scorer is None:
+                    from bert_score import BERTScorer
+                    if self.num_threads > 0:
+                        import torch
+                        torch.set_num_threads(self.num_threads)
+                    self._scorer = BERTScorer(
+                        model_type=self.model_type,
+                        num_layers=None,
+                        batch_size=self.batch_size
+                    )
+        return self._scorer
+
+    def warmup_in_background(self):
+        """Loads the model in a daemon thread so the first analysis does not wait for it"""
+        def warmup():
+            try:
+                self.get_scorer()
+            except Exception as e:
+                print(f"Error loading BERTScore model: {e}")
+
+        thread = threading.Thread(target=warmup, name="bertscore-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def score(self, candidates, references):
+        """Returns (P, R, F1) as NumPy arrays, scoring only pairs not seen before"""
+        pairs = [(str(candidate), str(reference)) for candidate, reference in zip(candidates, references)]
+        results = np.zeros((len(pairs), 3))
+
+        with self._cache_lock:
+            missing = OrderedDict()  # Unique uncached pair -> positions it occurs at
+            for position, pair in enumerate(pairs):
+                cached = self._scores.get(pair)
+                if cached is None:
+                    missing.setdefault(pair, []).append(position)
+                else:
+                    self._scores.move_to_end(pair)
+                    results[position] = cached
+
+        if missing:
+            new_pairs = list(missing)
+            with self._score_lock:
+                P, R, F1 = self.get_scorer().score(
+                    [candidate for candidate, _ in new_pairs],
+                    [reference for _, reference in new_pairs],
+                    batch_size=self.batch_size
+                )
+            scores = np.column_stack([P.numpy(), R.numpy(), F1.numpy()])
+
+            with self._cache_lock:
+                for pair, pair_scores in zip(new_pairs, scores):
+                    results[missing[pair]] = pair_scores
+                    self._scores[pair] = tuple(pair_scores)
+                while len(self._scores) > self.max_pairs:
+                    self._scores.popitem(last=False)
+
+        return results[:, 0], results[:, 1], results[:, 2]
+
+    def clear(self):
+        with self._cache_lock:
+            self._scores.clear()
+
+
+bert_scorer = BertScoreService(
+    model_type=BERTSCORE_MODEL,
+    batch_size=BERTSCORE_BATCH_SIZE,
+    num_threads=BERTSCORE_NUM_THREADS,
+    max_pairs=BERTSCORE_CACHE_MAX_PAIRS
+)
+
+
+def warmup_models():
+    """Starts loading the BERTScore model at startup when FANNOTATE_BERTSCORE_WARMUP is set"""
+    if BERTSCORE_WARMUP:
+        bert_scorer.warmup_in_background()
@@ -1,10 +1,14 @@
+import threading
 import gradio as gr
 from fannotate.annotator import TranscriptionAnnotator
+from fannotate.ingest import IngestProgress
+from fannotate.constants import UI_CONCURRENCY_LIMIT
+from fannotate.similarity import warmup_models
 from .tabs.upload import create_upload_tab
 from .tabs.settings import create_settings_tab
 from .tabs.codebook import create_codebook_tab
 from .tabs.autofill import create_autofill_tab
-from .tabs.review import create_review_tab
+from .tabs.review import create_review_tab, FAST_REVIEW_CSS, FAST_REVIEW_JS
 from .tabs.status import create_status_tab
 from .tabs.download import create_download_tab
 from .utils.display import process_df_for_display
@@ -15,7 +19,7 @@ def create_ui():
         primary_hue="cyan",
         secondary_hue="stone",
     )
-    demo = gr.Blocks(theme=theme)
+    demo = gr.Blocks(theme=theme, css=FAST_REVIEW_CSS, head=FAST_REVIEW_JS)
     #demo = gr.Blocks(theme='SebastianBravo/simci_css')
     with demo:
         # Add header markdown above tabs
@@ -35,16 +39,29 @@ def create_ui():
             
             # Connect cross-tab interactions
             def load_data(sheet, column):
-                """Load data with selected sheet and column"""
+                """Load data with selected sheet and column, showing the row count while it is read"""
+                progress = IngestProgress()
+                result = {}
+
+                def worker_main():
+                    result['value'] = annotator.load_settings(sheet, column, progress)
+
+                worker = threading.Thread(target=worker_main, daemon=True)
+                worker.start()
+                while worker.is_alive():
+                    worker.join(0.5)
+                    if worker.is_alive():
+                        yield (progress.summary(),) + (gr.update(),) * 6
+
                 try:
-                    status, preview = annotator.load_settings(sheet, column)
+                    status, preview = result['value']
                     current_codebook = annotator.load_codebook()
                     codes = [code["attribute"] for code in current_codebook]
                     
                     # Update slider maximum when data is loaded
                     max_index = len(preview) - 1 if preview is not None else 100
                     
-                    return (
+                    yield (
                         status,
                         process_df_for_display(preview),
                         review_components['code_select'],
@@ -54,7 +71,7 @@ def create_ui():
                         gr.Slider(maximum=max_index)  # Update slider maximum
                     )
                 except Exception as e:
-                    return (
+                    yield (
                         f"Error loading data: {str(e)}",
                         None,
                         gr.Dropdown(choices=[]),
@@ -79,7 +96,13 @@ def create_ui():
                     autofill_components['llm_code_select'],
                     codebook_components['codes_display'],
                     review_components['index_slider']  # Add slider to outputs
-                ]
+                ],
+                # Replacing the shared table is not safe to run twice at once
+                concurrency_limit=1
             )
 
+    # Events from different sessions run in parallel; the annotator guards the shared table
+    demo.queue(default_concurrency_limit=UI_CONCURRENCY_LIMIT)
+    # Load the BERTScore model ahead of the first analysis, if enabled
+    warmup_models()
     return demo 
\ No newline at end of file
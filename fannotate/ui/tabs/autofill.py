@@ -1,9 +1,18 @@
 import gradio as gr
-from ..utils.display import clean_column_name
+from fannotate.naming import clean_column_name
+from .autofill_handlers import (
+    create_prompt_from_json,
+    autofill_from_codebook,
+    autofill_all_attributes,
+    stream_autofill
+)
 
 def create_autofill_tab(annotator):
     """Creates and returns the auto-fill tab interface"""
     with gr.Tab("🤖 Auto-fill"):
+        # Progress of the batch this session started, while its worker thread runs
+        running_batch = gr.State(None)
+
         with gr.Row():
             gr.Markdown("## Auto annotation")
             
@@ -22,6 +31,24 @@ def create_autofill_tab(annotator):
             
         with gr.Row():
             auto_fill_btn = gr.Button("Auto-fill from Codebook", variant="primary")
+            auto_fill_all_btn = gr.Button("Auto-fill all attributes", variant="secondary")
+            cancel_btn = gr.Button("Cancel", variant="stop")
+
+        with gr.Row():
+            all_mode_select = gr.Radio(
+                label="Auto-fill all attributes mode",
+                choices=[
+                    ("One request per attribute", "per_attribute"),
+                    ("One JSON request per text", "json")
+                ],
+                value="per_attribute",
+                interactive=True
+            )
+            resume_checkbox = gr.Checkbox(
+                label="Resume: only fill rows without a value",
+                value=True,
+                interactive=True
+            )
             
         with gr.Row():
             llm_instruction = gr.TextArea(
@@ -44,37 +71,6 @@ def create_autofill_tab(annotator):
                 print(f"Error reloading LLM categories: {e}")
                 return gr.Dropdown(choices=[], value=None, allow_custom_value=True)
 
-        def get_category_values(code_name):
-            """Retrieves all possible values for a given category"""
-            try:
-                codebook = annotator.load_codebook()
-                for code in codebook:
-                    if code['attribute'] == code_name:
-                        return [v['category'] for v in code['categories']]
-                return []
-            except Exception as e:
-                print(f"Error getting category values: {e}")
-                return []
-
-        def create_prompt_from_json(json_data):
-            """Converts a JSON codebook entry into a formatted prompt string"""
-            try:
-                prompt = json_data.get('instruction', '')
-                
-                # Replace <<categories>> tag with formatted categories
-                categories_text = ""
-                for category in json_data.get('categories', []):
-                    categories_text += f"- {category['category']}: {category['description']}\n\n"
-                
-                prompt = prompt.replace('<<categories>>', categories_text.strip())
-                
-                # The <<text>> tag will be replaced later when processing each transcript
-                return prompt
-                
-            except Exception as e:
-                print(f"Error creating prompt: {str(e)}")
-                return None
-
         def generate_prompt(code_name):
             """Creates a structured prompt for the LLM"""
             if not code_name:
@@ -104,69 +100,36 @@ def create_autofill_tab(annotator):
                 print(f"Error generating prompt: {e}")
                 return f"Error generating prompt: {str(e)}"
 
-        def autofill_from_codebook(code_name, instruction):
-            """Automatically annotates text using the LLM"""
-            if not code_name or not instruction:
-                return "Please select a category and generate a prompt first"
-            
-            try:
-                # Load codebook and find selected category
-                codebook = annotator.load_codebook()
-                selected_code = None
-                for code in codebook:
-                    if code['attribute'] == code_name:
-                        selected_code = code
-                        break
-                        
-                if not selected_code:
-                    return "Selected category not found in codebook"
-                    
-                clean_name = clean_column_name(code_name)
-                output_column = f"autofill_{clean_name}"
-                
-                # Check if category type is categorical or freetext
-                is_categorical = selected_code.get('type', 'categorical') == 'categorical'
-                
-                if is_categorical:
-                    # Get valid values for categorical type
-                    valid_values = get_category_values(code_name)
-                    if not valid_values:
-                        return "No valid values found for the selected category"
-                    
-                    # Use constrained LLM call
-                    from fannotate.lm import batch_process_transcripts
-                    df, process_status = batch_process_transcripts(
-                        annotator.df,
-                        instruction,
-                        'text',
-                        output_column,
-                        valid_values
-                    )
-                    values_str = ", ".join(valid_values)
-                    status_msg = f"Processing with LLM constrained to values: [{values_str}]"
-                    
-                else:
-                    # Use unconstrained LLM call for freetext
-                    from fannotate.lm import batch_process_transcripts
-                    df, process_status = batch_process_transcripts(
-                        annotator.df,
-                        instruction,
-                        'text', 
-                        output_column,
-                        None  # No value constraints for freetext
-                    )
-                    status_msg = "Processing with unconstrained LLM for free text response"
-                    
-                if df is not None:
-                    annotator.df = df
-                    annotator.backup_df()
-                    return f"{status_msg}\n\nAuto-fill completed. Results stored in column: {output_column}"
-                else:
-                    return f"{status_msg}\n\nError during auto-fill: {process_status}"
-                    
-            except Exception as e:
-                print(f"Error in auto-fill process: {e}")
-                return f"Error during auto-fill: {str(e)}"
+        def run_with_progress(run):
+            """
+            Streams live progress of an auto-fill batch to the progress box. The batch's
+            progress is kept in the session state until its worker thread has finished,
+            so Cancel only stops batches started from this browser
+            """
+            from fannotate.lm import BatchProgress
+            progress = BatchProgress()
+            for status in stream_autofill(lambda: run(progress), progress):
+                yield status, progress
+            yield gr.update(), None
+
+        def start_autofill(code_name, instruction, resume):
+            """Auto-fills the selected category"""
+            yield from run_with_progress(
+                lambda progress: autofill_from_codebook(annotator, code_name, instruction, resume, progress)
+            )
+
+        def start_autofill_all(resume, mode):
+            """Auto-fills every codebook attribute in one pass over the data"""
+            yield from run_with_progress(
+                lambda progress: autofill_all_attributes(annotator, resume, progress, mode)
+            )
+
+        def cancel_autofill(progress):
+            """Stops sending new rows; rows already finished are kept"""
+            if progress is None:
+                return "No auto-fill is running"
+            progress.cancel()
+            return f"Cancelling auto-fill...\n\n{progress.summary()}"
 
         # Connect event handlers
         llm_reload_btn.click(
@@ -181,13 +144,31 @@ def create_autofill_tab(annotator):
         )
 
         auto_fill_btn.click(
-            fn=autofill_from_codebook,
-            inputs=[llm_code_select, llm_instruction],
+            fn=start_autofill,
+            inputs=[llm_code_select, llm_instruction, resume_checkbox],
+            outputs=[progress_bar, running_batch],
+            # Auto-fill writes to the shared table, so only one run at a time across all sessions
+            concurrency_limit=1,
+            concurrency_id="autofill"
+        )
+
+        auto_fill_all_btn.click(
+            fn=start_autofill_all,
+            inputs=[resume_checkbox, all_mode_select],
+            outputs=[progress_bar, running_batch],
+            concurrency_limit=1,
+            concurrency_id="autofill"
+        )
+
+        cancel_btn.click(
+            fn=cancel_autofill,
+            inputs=[running_batch],
             outputs=[progress_bar]
         )
 
         return {
             'llm_code_select': llm_code_select,
             'llm_instruction': llm_instruction,
-            'progress_bar': progress_bar
+            'progress_bar': progress_bar,
+            'cancel_btn': cancel_btn
         } 
\ No newline at end of file
@@ -0,0 +1,247 @@
+import threading
+from fannotate.naming import clean_column_name
+
+def get_category_values(annotator, code_name):
+    """Retrieves all possible values for a given category"""
+    try:
+        return annotator.get_codebook().category_values(code_name)
+    except Exception as e:
+        print(f"Error getting category values: {e}")
+        return []
+
+def create_prompt_from_json(json_data):
+    """Converts a JSON codebook entry into a formatted prompt string"""
+    try:
+        prompt = json_data.get('instruction', '')
+
+        # Replace <<categories>> tag with formatted categories
+        categories_text = ""
+        for category in json_data.get('categories', []):
+            categories_text += f"- {category['category']}: {category['description']}\n\n"
+
+        prompt = prompt.replace('<<categories>>', categories_text.strip())
+
+        # The <<text>> tag will be replaced later when processing each transcript
+        return prompt
+
+    except Exception as e:
+        print(f"Error creating prompt: {str(e)}")
+        return None
+
+def build_codebook_schema(codebook):
+    """Builds a JSON schema with one property per codebook attribute"""
+    properties = {}
+    for code in codebook:
+        if code.get('type', 'categorical') == 'categorical':
+            properties[code['attribute']] = {
+                "type": "string",
+                "enum": [cat['category'] for cat in code.get('categories', [])],
+                "description": code.get('description', '')
+            }
+        else:
+            properties[code['attribute']] = {
+                "type": "string",
+                "description": code.get('description', '')
+            }
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties.keys()),
+        "additionalProperties": False
+    }
+
+def create_extraction_prompt(codebook):
+    """Builds a single prompt that asks for every codebook attribute as one JSON object"""
+    sections = []
+    for code in codebook:
+        section = f"### {code['attribute']}\n{code.get('description', '')}"
+        if code.get('type', 'categorical') == 'categorical':
+            categories_text = "\n".join(
+                f"- {cat['category']}: {cat['description']}" for cat in code.get('categories', [])
+            )
+            section += f"\nAnswer with exactly one of these categories:\n{categories_text}"
+        else:
+            # Keep the attribute's own answer guidance, without the text placeholder
+            guidance = code.get('instruction', '').replace('<<text>>', '').replace('<<categories>>', '').strip()
+            if guidance:
+                section += f"\nAnswer as follows: {guidance}"
+        sections.append(section)
+
+    attributes_text = "\n\n".join(sections)
+    return (
+        "Annotate the text below for each of the following attributes. "
+        "Respond with a single JSON object that has one key per attribute name.\n\n"
+        f"{attributes_text}\n\n"
+        "Text:\n\n<<text>>"
+    )
+
+def autofill_from_codebook(annotator, code_name, instruction, resume=True, progress=None):
+    """Automatically annotates text using the LLM"""
+    if not code_name or not instruction:
+        return "Please select a category and generate a prompt first"
+    
+    try:
+        # Load codebook and find selected category
+        selected_code = annotator.get_codebook().get(code_name)
+                
+        if not selected_code:
+            return "Selected category not found in codebook"
+            
+        clean_name = clean_column_name(code_name)
+        output_column = f"autofill_{clean_name}"
+
+        from fannotate.lm import batch_process_transcripts, BatchProgress
+        if progress is None:
+            progress = BatchProgress()
+        checkpoint_path = annotator.get_checkpoint_path(output_column)
+        # Results go into the shared table under the annotator's lock as rows finish
+        writer = annotator.autofill_writer()
+        
+        # Check if category type is categorical or freetext
+        is_categorical = selected_code.get('type', 'categorical') == 'categorical'
+        
+        if is_categorical:
+            # Get valid values for categorical type
+            valid_values = get_category_values(annotator, code_name)
+            if not valid_values:
+                return "No valid values found for the selected category"
+            
+            # Use constrained LLM call
+            df, process_status = batch_process_transcripts(
+                writer.df,
+                instruction,
+                'text',
+                output_column,
+                valid_values,
+                checkpoint_path=checkpoint_path,
+                resume=resume,
+                progress=progress,
+                writer=writer
+            )
+            values_str = ", ".join(valid_values)
+            status_msg = f"Processing with LLM constrained to values: [{values_str}]"
+            
+        else:
+            # Use unconstrained LLM call for freetext
+            df, process_status = batch_process_transcripts(
+                writer.df,
+                instruction,
+                'text', 
+                output_column,
+                None,  # No value constraints for freetext
+                checkpoint_path=checkpoint_path,
+                resume=resume,
+                progress=progress,
+                writer=writer
+            )
+            status_msg = "Processing with unconstrained LLM for free text response"
+            
+        if df is not None:
+            annotator.backup_df()
+            return f"{status_msg}\n\n{process_status}\nResults stored in column: {output_column}\n\n{progress.summary()}"
+        else:
+            return f"{status_msg}\n\nError during auto-fill: {process_status}"
+            
+    except Exception as e:
+        print(f"Error in auto-fill process: {e}")
+        return f"Error during auto-fill: {str(e)}"
+
+def autofill_all_attributes(annotator, resume=True, progress=None, mode="per_attribute"):
+    """
+    Auto-fills every codebook attribute in one pass. mode="per_attribute" sends one
+    request per (row, attribute) through a shared work queue; mode="json" sends one
+    structured JSON request per row and fans the answer out into the attribute columns.
+    """
+    if annotator.df is None:
+        return "No data loaded"
+
+    try:
+        codebook = annotator.load_codebook()
+        if not codebook:
+            return "No attributes found in codebook"
+
+        for code in codebook:
+            if code.get('type', 'categorical') == 'categorical' and not code.get('categories'):
+                return f"No valid values found for '{code['attribute']}'"
+
+        output_columns = {
+            code['attribute']: f"autofill_{clean_column_name(code['attribute'])}"
+            for code in codebook
+        }
+
+        if mode == "json":
+            tasks = [{
+                "name": "json_extraction",
+                "instruction": create_extraction_prompt(codebook),
+                "schema": build_codebook_schema(codebook),
+                "output_columns": output_columns,
+                "checkpoint_path": annotator.get_checkpoint_path("json_extraction")
+            }]
+            status_msg = f"Extracting {len(codebook)} attributes with one JSON request per text"
+        else:
+            tasks = []
+            for code in codebook:
+                instruction = create_prompt_from_json(code)
+                if not instruction:
+                    return f"Error generating prompt for '{code['attribute']}'"
+
+                values = None
+                if code.get('type', 'categorical') == 'categorical':
+                    values = [v['category'] for v in code['categories']]
+
+                output_column = output_columns[code['attribute']]
+                tasks.append({
+                    "instruction": instruction,
+                    "output_column": output_column,
+                    "values": values,
+                    "checkpoint_path": annotator.get_checkpoint_path(output_column)
+                })
+            status_msg = f"Processing {len(tasks)} attributes in a single pass"
+
+        from fannotate.lm import batch_process_tasks, BatchProgress
+        if progress is None:
+            progress = BatchProgress()
+
+        writer = annotator.autofill_writer()
+        df, process_status = batch_process_tasks(writer.df, tasks, resume=resume, progress=progress, writer=writer)
+        columns = ", ".join(output_columns.values())
+
+        if df is not None:
+            annotator.backup_df()
+            return f"{status_msg}\n\n{process_status}\nResults stored in columns: {columns}\n\n{progress.summary()}"
+        else:
+            return f"{status_msg}\n\nError during auto-fill: {process_status}"
+
+    except Exception as e:
+        print(f"Error in auto-fill process: {e}")
+        return f"Error during auto-fill: {str(e)}"
+
+# Held by the worker thread of the running batch, so a second batch cannot start while
+# one whose browser disconnected is still writing to the table
+autofill_lock = threading.Lock()
+
+def stream_autofill(run, progress, poll_interval=0.5):
+    """Calls run() in a worker thread and yields live progress text until it returns a status"""
+    if not autofill_lock.acquire(blocking=False):
+        yield "Another auto-fill batch is still running. Try again when it has finished"
+        return
+    result = {}
+
+    def worker_main():
+        try:
+            result['status'] = run()
+        finally:
+            autofill_lock.release()
+
+    worker = threading.Thread(target=worker_main, daemon=True)
+    try:
+        worker.start()
+    except Exception:
+        autofill_lock.release()
+        raise
+    while worker.is_alive():
+        worker.join(poll_interval)
+        if worker.is_alive() and progress.total:
+            yield progress.summary()
+
+    yield result.get('status', "Error during auto-fill: worker stopped unexpectedly")
@@ -1,6 +1,6 @@
 import gradio as gr
 import json
-from ..utils.display import clean_column_name
+from fannotate.naming import clean_column_name
 from .codebook_handlers import (
     add_attribute_to_codebook,
     add_category_to_attribute,
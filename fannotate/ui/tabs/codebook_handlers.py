@@ -1,3 +1,5 @@
+import gradio as gr
+
 def add_attribute_to_codebook(annotator, name, description, attr_type, instruction):
     """Adds a new attribute to the existing codebook"""
     try:
@@ -9,8 +11,7 @@ def add_attribute_to_codebook(annotator, name, description, attr_type, instructi
         if not annotator.codebook_path.exists():
             annotator.create_new_codebook()
             
-        with open(annotator.codebook_path, 'r') as f:
-            codebook = json.load(f)
+        codebook = annotator.edit_codebook()
             
         # Check if attribute already exists
         if any(code['attribute'] == name for code in codebook['codes']):
@@ -30,8 +31,7 @@ def add_attribute_to_codebook(annotator, name, description, attr_type, instructi
         codebook['codes'].append(new_attribute)
         
         # Save updated codebook
-        with open(annotator.codebook_path, 'w') as f:
-            json.dump(codebook, f, indent=4)
+        annotator.write_codebook(codebook)
             
         # Return success message and clear all inputs
         return (f"Successfully added attribute: {name}", codebook,
@@ -48,8 +48,7 @@ def add_category_to_attribute(annotator, attribute_name, category, description,
             return ("Error: All fields are required", None,
                 attribute_name, category, description, icon)
             
-        with open(annotator.codebook_path, 'r') as f:
-            codebook = json.load(f)
+        codebook = annotator.edit_codebook()
             
         for code in codebook['codes']:
             if code['attribute'] == attribute_name:
@@ -63,8 +62,7 @@ def add_category_to_attribute(annotator, attribute_name, category, description,
                     "icon": icon or ""  # Store empty string if no icon provided
                 })
                 
-        with open(annotator.codebook_path, 'w') as f:
-            json.dump(codebook, f, indent=4)
+        annotator.write_codebook(codebook)
             
         return (f"Successfully added category '{category}'", codebook,
                 attribute_name, "", "", "")
@@ -76,8 +74,7 @@ def add_category_to_attribute(annotator, attribute_name, category, description,
 def update_attribute_choices(annotator):
     """Updates the attribute dropdown with current codebook attributes"""
     try:
-        codebook = annotator.load_codebook()
-        attributes = [code["attribute"] for code in codebook]
+        attributes = annotator.get_codebook().attributes
         return gr.Dropdown(choices=attributes)
     except Exception as e:
         print(f"Error updating attribute choices: {e}")
@@ -9,6 +9,13 @@ def create_download_tab(annotator):
         with gr.Row():
             gr.Markdown("Download the annotated data and codebook.")
             
+        with gr.Row():
+            export_format = gr.Radio(
+                choices=[("Excel (.xlsx)", "xlsx"), ("CSV", "csv"), ("Parquet", "parquet")],
+                value="xlsx",
+                label="File format"
+            )
+
         with gr.Row():
             download_btn = gr.Button("Download Annotated File", variant="primary")
             codebook_download_btn = gr.Button("Download Codebook", variant="secondary")
@@ -25,7 +32,8 @@ def create_download_tab(annotator):
         ############################################################
 
         download_btn.click(
-            fn=annotator.save_excel,
+            fn=annotator.export_table,
+            inputs=[export_format],
             outputs=[download_output, download_status]
         )
         
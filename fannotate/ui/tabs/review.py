@@ -1,12 +1,45 @@
 import gradio as gr
 from gradio_rich_textbox import RichTextbox
-from ..utils.display import clean_column_name
+from fannotate.naming import clean_column_name
 from .review_handlers import (
     update_value_choices_multi,
-    get_autofill_summary,
     navigate_transcripts,
-    save_multiple_annotations
+    save_multiple_annotations,
+    new_review_session,
+    end_review_session,
+    show_row,
+    show_assigned_row,
+    skip_assigned_row,
+    fast_review_keymap,
+    fast_label,
+    undo_fast_label
 )
+from .table_view import create_table_viewer
+
+# Number keys and Backspace click the hidden fast-review buttons while fast review is on,
+# unless the reviewer is typing in a text field
+FAST_REVIEW_JS = """
+<script>
+document.addEventListener('keydown', (event) => {
+    const toggle = document.querySelector('#fast-review-toggle input');
+    if (!toggle || !toggle.checked || event.ctrlKey || event.metaKey || event.altKey) return;
+    const target = event.target;
+    const typing = target && (target.isContentEditable || target.tagName === 'TEXTAREA' ||
+        (target.tagName === 'INPUT' && !['checkbox', 'radio'].includes(target.type)));
+    if (typing) return;
+    let id = null;
+    if (/^[1-9]$/.test(event.key)) id = 'fast-label-' + event.key;
+    else if (event.key === 'Backspace') id = 'fast-undo';
+    const button = id && document.getElementById(id);
+    if (button) {
+        event.preventDefault();
+        button.click();
+    }
+});
+</script>
+"""
+
+FAST_REVIEW_CSS = ".fast-review-keys { display: none !important; }"
 
 def create_review_tab(annotator, demo=None):
     """Creates and returns the review tab interface"""
@@ -14,6 +47,8 @@ def create_review_tab(annotator, demo=None):
         # Keep original code_select for compatibility
         code_select = gr.Dropdown(label="Category", choices=[], visible=False, interactive=True)
         value_select = gr.Radio(label="Value", choices=[], visible=False, interactive=True)
+        # Each browser session keeps its own position; the table itself is shared
+        session = gr.State(new_review_session(), delete_callback=end_review_session)
         
         with gr.Row():
             gr.Markdown("## Annotation review")
@@ -28,6 +63,33 @@ def create_review_tab(annotator, demo=None):
                 value="1",
                 interactive=True
             )
+            assign_mode = gr.Checkbox(
+                label="Assign me unreviewed texts",
+                info="Texts are handed out in batches so reviewers working at the same time never get the same text",
+                value=False
+            )
+            assign_priority = gr.Dropdown(
+                label="Review order",
+                info="Order of the texts you move on to, with or without assignments",
+                choices=[
+                    ("Table order", "order"),
+                    ("Lowest confidence first", "low_confidence"),
+                    ("Most informative first", "informative")
+                ],
+                value="order",
+                interactive=True
+            )
+            fast_mode = gr.Checkbox(
+                label="Fast review",
+                info="Number keys label the text with a value of category (1) and move on, Backspace undoes",
+                value=False,
+                elem_id="fast-review-toggle"
+            )
+
+        fast_keymap = gr.Markdown("")
+        # Clicked by the keyboard shortcuts in FAST_REVIEW_JS
+        with gr.Row(elem_classes="fast-review-keys"):
+            fast_key_btns = [gr.Button(str(key), elem_id=f"fast-label-{key}") for key in range(1, 10)]
             
         
         
@@ -67,6 +129,8 @@ def create_review_tab(annotator, demo=None):
                 )
             with gr.Column():
                 reload_codebook_btn = gr.Button("🔄 Refresh Categories", variant="secondary")
+                skip_btn = gr.Button("Skip", variant="secondary")
+                undo_btn = gr.Button("Undo fast review label", variant="secondary", elem_id="fast-undo")
                 annotate_next_btn = gr.Button("Annotate and continue to next!", variant="primary")#, size="lg")
 
         with gr.Row():
@@ -98,6 +162,10 @@ def create_review_tab(annotator, demo=None):
         
         with gr.Row():
             transcript_box = RichTextbox(label="Text content", interactive=False)
+
+        with gr.Accordion("Browse annotation table", open=False):
+            gr.Markdown("Select a row to review it.")
+            table_viewer = create_table_viewer(annotator)
         
 
         ############################################################
@@ -137,40 +205,51 @@ def create_review_tab(annotator, demo=None):
         # Event handlers
         ############################################################
         
-        def jump_to_index(index):
+        def jump_to_index(index, session):
             """Navigate to specific index using slider"""
             if annotator.df is None or annotator.selected_column is None:
-                return None, "**Current Index:** 0", "", ""
+                return None, "**Current Index:** 0", "", "", session
             try:
-                annotator.current_index = int(index)
-                text = annotator.df.iloc[annotator.current_index]['text']
-                categorical, freetext = get_autofill_summary(annotator, annotator.current_index)
-                return text, f"**Current Index:** {annotator.current_index}", categorical, freetext
+                return show_row(annotator, session, index) + (session,)
             except Exception as e:
                 print(f"Error jumping to index: {e}")
-                return None, "**Current Index:** 0", "", ""
+                return None, "**Current Index:** 0", "", "", session
 
         # Connect slider event
         index_slider.change(
             fn=jump_to_index,
-            inputs=[index_slider],
+            inputs=[index_slider, session],
             outputs=[
                 transcript_box,
                 current_index_display,
                 categorical_summary,
-                freetext_summary
+                freetext_summary,
+                session
             ]
         )
 
+        def select_table_row(evt: gr.SelectData):
+            """Moves the slider to the row selected in the table viewer"""
+            return gr.Slider(value=int(evt.row_value[0]))
+
+        # Selecting a row in the table viewer navigates to it through the slider
+        table_viewer['table'].select(
+            fn=select_table_row,
+            outputs=[index_slider]
+        )
+
         # Connect annotation handlers
         annotate_next_btn.click(
             fn=lambda *args: save_multiple_annotations(annotator, *args),
             inputs=[
+                session,
                 code_select1, value_select1_radio, value_select1_text,
                 code_select2, value_select2_radio, value_select2_text,
                 code_select3, value_select3_radio, value_select3_text,
                 code_select4, value_select4_radio, value_select4_text,
-                num_categories
+                num_categories,
+                assign_mode,
+                assign_priority
             ],
             outputs=[
                 annotation_status,
@@ -178,10 +257,78 @@ def create_review_tab(annotator, demo=None):
                 current_index_display,
                 categorical_summary,
                 freetext_summary,
-                index_slider
+                index_slider,
+                session
             ]
         )
 
+        review_outputs = [
+            annotation_status,
+            transcript_box,
+            current_index_display,
+            categorical_summary,
+            freetext_summary,
+            index_slider,
+            session
+        ]
+
+        # Fast review: a key labels the text and the next one is shown while the label saves
+        for key, key_btn in enumerate(fast_key_btns, 1):
+            key_btn.click(
+                fn=lambda session, code, assign, priority, key=key:
+                    fast_label(annotator, session, code, key, assign, priority),
+                inputs=[session, code_select1, assign_mode, assign_priority],
+                outputs=review_outputs,
+                show_progress="hidden"
+            )
+
+        undo_btn.click(
+            fn=lambda session: undo_fast_label(annotator, session),
+            inputs=[session],
+            outputs=review_outputs,
+            show_progress="hidden"
+        )
+
+        for component in [fast_mode, code_select1]:
+            component.change(
+                fn=lambda enabled, code: fast_review_keymap(annotator, code, enabled),
+                inputs=[fast_mode, code_select1],
+                outputs=[fast_keymap]
+            )
+
+        assigned_outputs = [
+            transcript_box,
+            current_index_display,
+            categorical_summary,
+            freetext_summary,
+            index_slider,
+            session
+        ]
+
+        def start_assignments(enabled, priority, session):
+            """Jumps to the first assigned text when assignment mode is switched on"""
+            if not enabled:
+                return (gr.update(),) * 5 + (session,)
+            return show_assigned_row(annotator, session, priority)
+
+        assign_mode.change(
+            fn=start_assignments,
+            inputs=[assign_mode, assign_priority, session],
+            outputs=assigned_outputs
+        )
+
+        def skip_text(enabled, priority, session):
+            """Skips to the next assigned text, or simply the next text without assignments"""
+            if enabled:
+                return skip_assigned_row(annotator, session, priority)
+            return navigate_transcripts(annotator, "next", session, priority)
+
+        skip_btn.click(
+            fn=skip_text,
+            inputs=[assign_mode, assign_priority, session],
+            outputs=assigned_outputs
+        )
+
         # Connect value selection handlers for each category
         for code_select_n, radio_n, text_n in [
             (code_select1, value_select1_radio, value_select1_text),
@@ -196,26 +343,26 @@ def create_review_tab(annotator, demo=None):
             )
 
         # Add a function to get initial data
-        def get_initial_data():
-            """Get initial data for the first entry"""
+        def get_initial_data(session):
+            """Get data for the entry this session is at"""
             if annotator.df is None or annotator.selected_column is None:
-                return None, "**Current Index:** 0", "", ""
+                return None, "**Current Index:** 0", "", "", session
             try:
-                text = annotator.df.iloc[0]['text']
-                categorical, freetext = get_autofill_summary(annotator, 0)
-                return text, "**Current Index:** 0", categorical, freetext
+                return show_row(annotator, session, session["index"]) + (session,)
             except Exception as e:
                 print(f"Error loading initial data: {e}")
-                return None, "**Current Index:** 0", "", ""
+                return None, "**Current Index:** 0", "", "", session
 
         # Add tab selection event
         review_tab.select(
             fn=get_initial_data,
+            inputs=[session],
             outputs=[
                 transcript_box,
                 current_index_display,
                 categorical_summary,
-                freetext_summary
+                freetext_summary,
+                session
             ]
         )
 
@@ -227,5 +374,6 @@ def create_review_tab(annotator, demo=None):
             'freetext_summary': freetext_summary,
             'current_index_display': current_index_display,
             'annotation_status': annotation_status,
-            'index_slider': index_slider
+            'index_slider': index_slider,
+            'session': session
         } 
\ No newline at end of file
@@ -1,5 +1,20 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 import gradio as gr
 import pandas as pd
+from fannotate.constants import REVIEW_PREFETCH_ROWS
+from fannotate.metrics import ResultCache
+
+# Rendered auto-fill summaries per (row, row state, codebook), shared by all sessions
+summary_cache = ResultCache(max_entries=1024)
+prefetch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fannotate-prefetch")
+
+# Fast-review labels are saved here in the order they were given, so undo sees them in order
+fast_save_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fannotate-fast-save")
+# Reviewer -> {save id: future} of fast-review saves whose outcome was not read yet. Futures
+# cannot be copied, so they are kept here instead of in the session state
+fast_saves = {}
+FAST_REVIEW_HISTORY = 50  # Labels per session that can be undone
 
 def update_value_choices_multi(annotator, code_name):
     """Updates the value selection component based on the attribute type"""
@@ -9,12 +24,7 @@ def update_value_choices_multi(annotator, code_name):
             gr.Textbox(value="", visible=False)
         ]
     try:
-        codebook = annotator.load_codebook()
-        selected_code = None
-        for code in codebook:
-            if code['attribute'] == code_name:
-                selected_code = code
-                break
+        selected_code = annotator.get_codebook().get(code_name)
         
         if selected_code:
             # Check the attribute type
@@ -47,77 +57,149 @@ def update_value_choices_multi(annotator, code_name):
             gr.Textbox(value="", visible=False)
         ]
 
+def render_autofill_summary(annotator, codebook, index):
+    """Renders the categorical and free-text summaries of a row's auto-fill annotations"""
+    columns = [column for column in annotator.df.columns if column.startswith('autofill_')]
+    cells, _ = annotator.read_cells(index, columns)
+        
+    categorical_summary = []
+    freetext_summary = []
+    
+    for column, value in cells.items():
+        attribute = codebook.column_attribute(column)
+        if attribute is not None and pd.notna(value):
+            clean_col = column.replace('autofill_', '')
+            if codebook.attribute_type(attribute) == 'categorical':
+                if codebook.has_category(attribute, value):
+                    icon = codebook.icon(attribute, value)
+                    categorical_summary.append(f"[b][u]{clean_col}[/u][/b]: {icon} {value}<br>")
+            else:
+                freetext_summary.append(f"[b][u]{clean_col}[/u][/b]: {value}<br><br>")
+                
+    return (
+        "\n".join(categorical_summary) if categorical_summary else "No categorical annotations",
+        "\n".join(freetext_summary) if freetext_summary else "No free-text annotations"
+    )
+
+def _summary_key(annotator, codebook, index):
+    # The codebook object is part of the key, so reloading the codebook re-renders rows
+    return index, annotator.row_state(index), codebook
+
 def get_autofill_summary(annotator, index):
     """Get separate summaries for categorical and free-text annotations"""
     try:
         if annotator.df is None or index >= len(annotator.df):
             return "", ""
             
-        codebook = annotator.load_codebook()
-            
-        categorical_summary = []
-        freetext_summary = []
-        
-        for column in annotator.df.columns:
-            if column.startswith('autofill_'):
-                value = annotator.df.iloc[index][column]
-                if pd.notna(value):
-                    clean_col = column.replace('autofill_', '')
-                    
-                    # Find attribute type from codebook
-                    for code in codebook:
-                        if code['attribute'] == clean_col:
-                            if code['type'] == 'categorical':
-                                for cat in code['categories']:
-                                    if cat['category'] == value:
-                                        icon = cat.get('icon', '')
-                                        categorical_summary.append(f"[b][u]{clean_col}[/u][/b]: {icon} {value}<br>")
-                                        break
-                            else:
-                                freetext_summary.append(f"[b][u]{clean_col}[/u][/b]: {value}<br><br>")
-                            break
-                    
-        return (
-            "\n".join(categorical_summary) if categorical_summary else "No categorical annotations",
-            "\n".join(freetext_summary) if freetext_summary else "No free-text annotations"
+        codebook = annotator.get_codebook()
+        return summary_cache.get_or_compute(
+            _summary_key(annotator, codebook, index),
+            lambda: render_autofill_summary(annotator, codebook, index)
         )
         
     except Exception as e:
         print(f"Error getting autofill summary: {e}")
         return "Error loading categorical annotations", "Error loading free-text annotations"
 
-def navigate_transcripts(annotator, direction):
-    """Navigate through transcripts and return updated values including current index"""
+def prefetch_summaries(annotator, index, rows=REVIEW_PREFETCH_ROWS):
+    """Renders the summaries of the next rows in the background, so moving on is instant"""
+    if annotator.df is None:
+        return
+    codebook = annotator.get_codebook()
+    for next_index in range(index + 1, min(index + 1 + rows, len(annotator.df))):
+        summary_cache.get_or_submit(
+            _summary_key(annotator, codebook, next_index),
+            lambda next_index=next_index: render_autofill_summary(annotator, codebook, next_index),
+            prefetch_pool
+        )
+
+def new_review_session():
+    """Per-browser-session review state: the row shown and its version when it was read"""
+    return {"index": 0, "version": 0}
+
+def end_review_session(session):
+    """Drops the fast-review saves of a closed session; used as the session state's delete_callback"""
+    if session and session.get("reviewer"):
+        fast_saves.pop(session["reviewer"], None)
+
+def _reviewer(session):
+    """Returns the id assignments are leased to; created on first use so every session gets its own"""
+    if not session.get("reviewer"):
+        session["reviewer"] = uuid.uuid4().hex
+    return session["reviewer"]
+
+def show_row(annotator, session, index):
+    """Reads a row for one session and returns (text, index display, categorical, freetext)"""
+    index = max(0, min(int(index), len(annotator.df) - 1))
+    cells, version = annotator.read_cells(index, ['text'])
+    session["index"] = index
+    session["version"] = version
+    categorical, freetext = get_autofill_summary(annotator, index)
+    prefetch_summaries(annotator, index)
+    return cells['text'], f"**Current Index:** {index}", categorical, freetext
+
+def following_row(annotator, row, priority="order"):
+    """Returns the row after row in the review order, or row itself when none is left"""
+    next_row = annotator.assignments.following_row(row, priority)
+    return row if next_row is None else next_row
+
+def navigate_transcripts(annotator, direction, session, priority="order"):
+    """
+    Navigate through transcripts and return updated values including current index.
+    "next" follows the review order, "previous" goes back one row in the table
+    """
     if annotator.df is None or annotator.selected_column is None:
-        return None, "**Current Index:** 0", "", "", 0
+        return None, "**Current Index:** 0", "", "", 0, session
     try:
         if direction == "next":
-            annotator.current_index = min(annotator.current_index + 1, len(annotator.df) - 1)
+            index = following_row(annotator, session["index"], priority)
         else:
-            annotator.current_index = max(annotator.current_index - 1, 0)
-            
-        text = annotator.df.iloc[annotator.current_index]['text']
-        categorical, freetext = get_autofill_summary(annotator, annotator.current_index)
+            index = session["index"] - 1
+        text, index_display, categorical, freetext = show_row(annotator, session, index)
         
         return (
             text, 
-            f"**Current Index:** {annotator.current_index}", 
+            index_display, 
             categorical, 
             freetext,
-            annotator.current_index  # Return current index for slider
+            session["index"],  # Return current index for slider
+            session
         )
     except Exception as e:
         print(f"Error navigating transcripts: {e}")
-        return None, "**Current Index:** 0", "", "", 0
+        return None, "**Current Index:** 0", "", "", 0, session
+
+def show_assigned_row(annotator, session, priority="order"):
+    """Shows the next unreviewed row leased to this session's reviewer"""
+    if annotator.df is None or annotator.selected_column is None:
+        return None, "**Current Index:** 0", "", "", session["index"], session
+    row = annotator.assignments.next_row(_reviewer(session), priority)
+    if row is None:
+        return ("No unreviewed texts left to assign", "**Current Index:** -", "", "",
+                session["index"], session)
+    text, index_display, categorical, freetext = show_row(annotator, session, row)
+    return text, index_display, categorical, freetext, session["index"], session
+
+def skip_assigned_row(annotator, session, priority="order"):
+    """Hands the current row back to the pool and shows the next assigned one"""
+    if annotator.df is not None:
+        annotator.assignments.skip(_reviewer(session), session["index"])
+    return show_assigned_row(annotator, session, priority)
 
-def save_multiple_annotations(annotator, code1, value1_radio, value1_text, 
+def save_multiple_annotations(annotator, session, code1, value1_radio, value1_text, 
                             code2, value2_radio, value2_text,
                             code3, value3_radio, value3_text,
                             code4, value4_radio, value4_text, 
-                            num_cats):
-    """Save multiple annotations and navigate to next transcript"""
-    current_index = annotator.current_index  # Store current index before navigation
-    status_messages = []
+                            num_cats, assign_mode=False, priority="order"):
+    """
+    Save multiple annotations for the session's row and navigate to the next transcript
+    in the priority's review order, or to the next assigned row when assign_mode is on
+    """
+    if annotator.df is None:
+        return "No data loaded", None, "**Current Index:** 0", "", "", gr.Slider(value=0), session
+    current_index = session["index"]  # Store current index before navigation
+    codebook = annotator.get_codebook()
+    annotations = {}
     
     for i, (code, radio_val, text_val) in enumerate([
         (code1, value1_radio, value1_text),
@@ -128,12 +210,7 @@ def save_multiple_annotations(annotator, code1, value1_radio, value1_text,
         if i <= int(num_cats):
             if code:
                 # Determine if this is a categorical or freetext attribute
-                codebook = annotator.load_codebook()
-                attr_type = 'categorical'  # default
-                for c in codebook:
-                    if c['attribute'] == code:
-                        attr_type = c.get('type', 'categorical')
-                        break
+                attr_type = codebook.attribute_type(code)
                 
                 # For categorical type, use radio_val
                 # For freetext type, use the entire text_val without any processing
@@ -143,13 +220,22 @@ def save_multiple_annotations(annotator, code1, value1_radio, value1_text,
                     value = text_val  # Use raw text input without any processing
 
                 if value:  # Check if there's any input
-                    status, _ = annotator.save_annotation(code, value)
-                    # Add index number to status message
-                    status_messages.append(f"[Index {current_index}] {status}")
+                    annotations[code] = value
 
-    # Navigate to next transcript after saving
-    text, index = annotator.navigate_transcripts("next")
-    categorical, freetext = get_autofill_summary(annotator, index)
+    saved = True
+    status_messages = []
+    if annotations:
+        saved, messages = annotator.save_annotations(current_index, annotations, session["version"])
+        # Add index number to status message
+        status_messages = [f"[Index {current_index}] {message}" for message in messages]
+
+    # Navigate to next transcript after saving, or show the newer values after a conflict
+    if saved and assign_mode:
+        annotator.assignments.complete(_reviewer(session), current_index)
+        text, index_display, categorical, freetext, _, _ = show_assigned_row(annotator, session, priority)
+    else:
+        next_index = following_row(annotator, current_index, priority) if saved else current_index
+        text, index_display, categorical, freetext = show_row(annotator, session, next_index)
     
     # Format status messages with double line breaks
     formatted_status = "**Annotation Status:**\n\n" + "\n\n".join(status_messages) if status_messages else "No annotations added"
@@ -158,8 +244,131 @@ def save_multiple_annotations(annotator, code1, value1_radio, value1_text,
     return (
         formatted_status, 
         text, 
-        f"**Current Index:** {annotator.current_index}",
+        index_display,
+        categorical,
+        freetext,
+        gr.Slider(value=session["index"]),  # Update slider value
+        session
+    )
+
+def fast_review_keymap(annotator, code, enabled):
+    """Shows which number key gives which category in fast-review mode"""
+    if not enabled:
+        return ""
+    codebook = annotator.get_codebook()
+    if not code or codebook.attribute_type(code) != 'categorical':
+        return "Select a categorical category in (1) to use fast review"
+    keys = [f"**{key}** {codebook.icon(code, category)} {category}"
+            for key, category in enumerate(codebook.category_values(code)[:9], 1)]
+    return " · ".join(keys) + " · **Backspace** undo"
+
+def _fast_save_result(reviewer, entry, wait=False):
+    """
+    Returns (saved, messages) of a history entry's background save, or None while it is
+    still running. The outcome is kept in the entry and the future is dropped.
+    """
+    if "saved" in entry:
+        return entry["saved"], []
+    saves = fast_saves.get(reviewer, {})
+    future = saves.get(entry["id"])
+    if future is None:
+        return False, []
+    if not wait and not future.done():
+        return None
+    saved, messages = future.result()
+    entry["saved"] = saved
+    saves.pop(entry["id"], None)
+    return saved, messages
+
+def _fast_review_status(annotator, session, reviewer):
+    """Reports background saves that finished without saving since the last report"""
+    messages = []
+    for entry in session.get("history", []):
+        if "saved" in entry:
+            continue
+        result = _fast_save_result(reviewer, entry)
+        if result is not None and not result[0]:
+            messages += [f"[Index {entry['row']}] {message}" for message in result[1]]
+    return messages
+
+def fast_label(annotator, session, code, key, assign_mode=False, priority="order"):
+    """
+    Labels the session's row with the key-th category of code and shows the next row
+    straight away. The label is saved in the background; problems are reported on the
+    next step.
+    """
+    if annotator.df is None:
+        return "No data loaded", None, "**Current Index:** 0", "", "", gr.Slider(value=0), session
+    codebook = annotator.get_codebook()
+    categories = codebook.category_values(code) if code else []
+    if not code or codebook.attribute_type(code) != 'categorical' or not 1 <= key <= len(categories):
+        return ((f"**Annotation Status:** No category for key {key}",) + (gr.update(),) * 5 + (session,))
+
+    reviewer = _reviewer(session)
+    row = session["index"]
+    category = categories[key - 1]
+
+    # Remember what the label overwrites, so it can be undone
+    _, user_col = codebook.columns_for(code)
+    columns = [column for column in (user_col, 'is_reviewed') if column in annotator.df.columns]
+    cells, _ = annotator.read_cells(row, columns)
+    previous = {user_col: cells.get(user_col), 'is_reviewed': bool(cells.get('is_reviewed', False))}
+    # Saved only if the row is still as the reviewer saw it; then previous holds what it overwrites
+    version = session["version"]
+
+    session["saves"] = session.get("saves", 0) + 1
+    fast_saves.setdefault(reviewer, {})[session["saves"]] = fast_save_pool.submit(
+        annotator.save_annotations, row, {code: category}, version
+    )
+    history = session.setdefault("history", [])
+    history.append({"id": session["saves"], "row": row, "version": version, "previous": previous, "label": category})
+    while len(history) > FAST_REVIEW_HISTORY:
+        fast_saves.get(reviewer, {}).pop(history.pop(0)["id"], None)
+
+    if assign_mode:
+        annotator.assignments.complete(reviewer, row)
+        text, index_display, categorical, freetext, _, _ = show_assigned_row(annotator, session, priority)
+    else:
+        text, index_display, categorical, freetext = show_row(annotator, session, following_row(annotator, row, priority))
+
+    messages = [f"[Index {row}] {codebook.icon(code, category)} {category}"] + _fast_review_status(annotator, session, reviewer)
+    return (
+        "**Annotation Status:**\n\n" + "\n\n".join(messages),
+        text,
+        index_display,
+        categorical,
+        freetext,
+        gr.Slider(value=session["index"]),
+        session
+    )
+
+def undo_fast_label(annotator, session):
+    """Reverts the last fast-review label of this session and goes back to its row"""
+    if annotator.df is None:
+        return "No data loaded", None, "**Current Index:** 0", "", "", gr.Slider(value=0), session
+    history = session.get("history", [])
+    if not history:
+        return ("**Annotation Status:** Nothing to undo",) + (gr.update(),) * 5 + (session,)
+
+    reviewer = _reviewer(session)
+    entry = history.pop()
+    # Waits for the save if it is still running
+    saved, _ = _fast_save_result(reviewer, entry, wait=True)
+
+    if not saved:
+        message = f"[Index {entry['row']}] The label was not saved, nothing to undo"
+    elif annotator.undo_edit(entry["row"], entry["previous"], entry["version"] + 1):
+        message = f"[Index {entry['row']}] Undid label {entry['label']}"
+    else:
+        message = f"[Index {entry['row']}] Changed by another reviewer since, the label was kept"
+
+    text, index_display, categorical, freetext = show_row(annotator, session, entry["row"])
+    return (
+        f"**Annotation Status:**\n\n{message}",
+        text,
+        index_display,
         categorical,
         freetext,
-        gr.Slider(value=annotator.current_index)  # Update slider value
-    ) 
\ No newline at end of file
+        gr.Slider(value=session["index"]),
+        session
+    )
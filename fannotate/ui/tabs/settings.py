@@ -1,5 +1,5 @@
 import gradio as gr
-from ..utils.display import clean_column_name
+from fannotate.naming import clean_column_name
 from ...constants import MODEL_CHOICES, BASE_URLS
 
 def create_settings_tab(annotator):
@@ -47,6 +47,33 @@ def create_settings_tab(annotator):
                     maximum=10000,
                     step=100
                 )
+                max_concurrency = gr.Number(
+                    value=8,
+                    label="Max Concurrent Requests",
+                    info="Number of requests sent to the LLM at the same time during auto-fill",
+                    interactive=True,
+                    minimum=1,
+                    maximum=256,
+                    step=1
+                )
+
+        with gr.Row():
+            requests_per_minute = gr.Number(
+                value=0,
+                label="Requests per Minute",
+                info="Request rate limit for the selected framework (0 = no limit)",
+                interactive=True,
+                minimum=0,
+                step=1
+            )
+            tokens_per_minute = gr.Number(
+                value=0,
+                label="Tokens per Minute",
+                info="Estimated token rate limit for the selected framework (0 = no limit)",
+                interactive=True,
+                minimum=0,
+                step=1000
+            )
 
         with gr.Row(visible=True) as default_settings:
             temperature = gr.Slider(
@@ -126,12 +153,21 @@ def create_settings_tab(annotator):
             gr.Markdown("""**Temperature:** 
                         - Controls the randomness in the model's responses. A value of 0.0 makes the model more deterministic, always choosing the most likely next token. Higher values (up to 2.0) make the output more random and 'creative'. For annotation tasks, lower values (0.0-0.3) are recommended for consistency.""", container=copntainer_onoff)
 
+        with gr.Row():
+            gr.Markdown("""**Max Concurrent Requests:** 
+                        - How many rows are sent to the LLM at the same time during auto-fill. vLLM batches concurrent requests on the GPU, so higher values (16-64) usually give much higher throughput. Lower this if the endpoint starts rejecting requests.""", container=copntainer_onoff)
+
+        with gr.Row():
+            gr.Markdown("""**Requests/Tokens per Minute:** 
+                        - Rate limits applied per framework, so auto-fill stays within your quota. Throttled requests (429/503) are retried with exponential backoff, honouring the server's Retry-After header, and concurrency is lowered automatically while the endpoint is throttling. Leave at 0 for no limit.""", container=copntainer_onoff)
+
         ############################################################
         # Event handlers
         ############################################################
 
         def apply_settings(framework, model, max_tokens_val, temp_val, 
-                         chat_id_val, history_size_val, max_transcript_length_val):
+                         chat_id_val, history_size_val, max_transcript_length_val,
+                         max_concurrency_val, requests_per_minute_val, tokens_per_minute_val):
             try:
                 from fannotate.lm import update_llm_config
                 update_llm_config(
@@ -143,7 +179,10 @@ def create_settings_tab(annotator):
                     temperature=float(temp_val),
                     chat_id=chat_id_val,
                     history_size=int(history_size_val) if history_size_val else None,
-                    max_transcript_length=int(max_transcript_length_val)
+                    max_transcript_length=int(max_transcript_length_val),
+                    max_concurrency=int(max_concurrency_val) if max_concurrency_val else None,
+                    requests_per_minute=int(requests_per_minute_val or 0),
+                    tokens_per_minute=int(tokens_per_minute_val or 0)
                 )
                 return "Settings applied successfully"
             except Exception as e:
@@ -178,7 +217,10 @@ def create_settings_tab(annotator):
                 temperature,
                 chat_id,
                 history_size,
-                max_transcript_length
+                max_transcript_length,
+                max_concurrency,
+                requests_per_minute,
+                tokens_per_minute
             ],
             outputs=[settings_status]
         )
@@ -193,5 +235,8 @@ def create_settings_tab(annotator):
             'chat_id': chat_id,
             'history_size': history_size,
             'max_transcript_length': max_transcript_length,
+            'max_concurrency': max_concurrency,
+            'requests_per_minute': requests_per_minute,
+            'tokens_per_minute': tokens_per_minute,
             'settings_status': settings_status
         } 
@@ -1,13 +1,92 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import gradio as gr
+from gradio.components.plot import PlotData
+from gradio.processing_utils import encode_plot_to_base64
 from gradio_rich_textbox import RichTextbox
-from sklearn.metrics import accuracy_score, f1_score, confusion_matrix
+import numpy as np
 import seaborn as sns
-import matplotlib.pyplot as plt
-from bert_score import BERTScorer
-from rouge_score import rouge_scorer
 import pandas as pd
-import matplotlib
-matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from fannotate.constants import ANALYSIS_WORKERS
+from fannotate.metrics import (
+    ResultCache,
+    categorical_agreement,
+    comparison_pairs,
+    disagreement_table,
+    rouge_scores
+)
+from fannotate.similarity import bert_scorer
+
+# Analyses run here instead of on the UI event workers, and their results are shared
+# by all sessions until the compared columns change
+analysis_pool = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix="fannotate-analysis")
+analysis_cache = ResultCache()
+
+
+def dark_figure(figsize, ncols=1):
+    """
+    Creates a dark-themed figure without pyplot, so figures can be drawn on worker
+    threads without touching global state
+    """
+    fig = Figure(figsize=figsize, facecolor='black')
+    axes = fig.subplots(1, ncols)
+    for ax in np.atleast_1d(axes):
+        ax.set_facecolor('black')
+        ax.tick_params(colors='white')
+        for spine in ax.spines.values():
+            spine.set_color('white')
+    return fig, axes
+
+
+def confusion_figure(cm, labels, category):
+    fig, ax = dark_figure((8, 6))
+    sns.heatmap(
+        cm, 
+        annot=True, 
+        fmt='d',
+        cmap=sns.dark_palette("#69d", as_cmap=True),
+        xticklabels=labels,
+        yticklabels=labels,
+        ax=ax,
+        cbar_kws={'label': 'Count'},
+        annot_kws={'color': 'white', 'fontsize': 10}
+    )
+    colorbar = ax.collections[0].colorbar
+    colorbar.ax.tick_params(colors='white')
+    colorbar.ax.yaxis.label.set_color('white')
+
+    ax.set_title(f'Confusion Matrix - {category}', color='white', pad=20)
+    ax.set_ylabel('Human annotation', color='white')
+    ax.set_xlabel('Model annotation', color='white')
+    fig.tight_layout()
+    return fig
+
+
+def distribution_figure(bert_scores, rouge):
+    """Plots BERTScore and ROUGE F1 distributions side by side"""
+    fig, (ax1, ax2) = dark_figure((15, 6), ncols=2)
+    
+    # Plot 1: BERTScore distributions
+    for scores, label, color in zip(bert_scores, ('Precision', 'Recall', 'F1'), ('blue', 'green', 'red')):
+        sns.kdeplot(data=scores, label=label, ax=ax1, color=color)
+        ax1.axvline(scores.mean(), color=color, linestyle='--', alpha=0.5)
+    ax1.set_title('BERTScore Distribution', color='white', pad=20)
+    ax1.set_xlabel('Score', color='white')
+    ax1.set_ylabel('Density', color='white')
+    ax1.legend(facecolor='black', labelcolor='white')
+
+    # Plot 2: ROUGE F1 distributions
+    for metric, label, color in (('rouge1', 'ROUGE-1', 'blue'), ('rouge2', 'ROUGE-2', 'green'), ('rougeL', 'ROUGE-L', 'red')):
+        sns.kdeplot(data=rouge[metric]['f'], label=label, ax=ax2, color=color)
+    ax2.set_title('ROUGE Score Distribution', color='white', pad=20)
+    ax2.set_xlabel('F1 Score', color='white')
+    ax2.set_ylabel('Density', color='white')
+    ax2.legend(facecolor='black', labelcolor='white')
+
+    fig.tight_layout()
+    return fig
+
 
 def create_status_tab(annotator, demo=None):
     """Creates and returns the status tab interface"""
@@ -65,6 +144,8 @@ def create_status_tab(annotator, demo=None):
 
         with gr.Row():
             disagreement_index_display = gr.Markdown("**Current Disagreement:** 0 of 0")
+        # Disagreements of the last analysis, kept per browser session
+        disagreements_state = gr.State(None)
             
         with gr.Row():
             disagreement_text = RichTextbox(
@@ -78,232 +159,136 @@ def create_status_tab(annotator, demo=None):
         # Event handlers
         ############################################################
 
-        def update_statistics(category):
-            """Update statistics for selected category"""
-            try:
-                if not category:
-                    return "Please select a category", None, None, None, "", "", ""
-                    
-                auto_col = f"autofill_{category}"
-                user_col = f"user_{category}"
-                
-                if auto_col not in annotator.df.columns or user_col not in annotator.df.columns:
-                    return "No comparison data available for this category", None, None, None, "", "", ""
-                    
-                # Get only rows where both auto and user annotations exist
-                mask = annotator.df[auto_col].notna() & annotator.df[user_col].notna()
-                if not mask.any():
-                    return "No matching annotations found for comparison", None, None, None, "", "", ""
-                    
-                # Get the attribute type and category icons from codebook
-                codebook = annotator.load_codebook()
-                attr_type = 'categorical'  # default
-                category_icons = {}  # Dictionary to store category-icon mappings
-                for code in codebook:
-                    if code['attribute'] == category:
-                        attr_type = code.get('type', 'categorical')
-                        # Create mapping of categories to their icons
-                        for cat in code.get('categories', []):
-                            category_icons[cat['category']] = cat.get('icon', '')
-                        break
-
-                y_true = annotator.df[user_col][mask]
-                y_pred = annotator.df[auto_col][mask]
-
-                # Create disagreements table
-                disagreements_df = None
-                if len(y_true) > 0:
-                    # Get indices where annotations differ
-                    diff_mask = y_true != y_pred
-                    if diff_mask.any():
-                        # Create DataFrame with relevant columns and add icons
-                        disagreements_df = pd.DataFrame({
-                            'Original_Index': annotator.df.index[mask][diff_mask],
-                            'Text': annotator.df['text'][mask][diff_mask],
-                            'Model Annotation': y_pred[diff_mask].apply(lambda x: f"{category_icons.get(x, '')} {x}" if attr_type == 'categorical' else x),
-                            'Human Annotation': y_true[diff_mask].apply(lambda x: f"{category_icons.get(x, '')} {x}" if attr_type == 'categorical' else x)
-                        })
-
-                # Store disagreements in annotator for navigation
-                annotator.current_disagreements = disagreements_df if disagreements_df is not None else pd.DataFrame()
-                
-                # Update slider maximum if there are disagreements
-                slider_props = {
-                    "maximum": len(annotator.current_disagreements) - 1 if disagreements_df is not None else 0,
-                    "value": 0
-                }
-                
-                # Initialize disagreement view if there are disagreements
-                if disagreements_df is not None and len(disagreements_df) > 0:
-                    first_row = disagreements_df.iloc[0]
-                    disagreement_text = first_row['Text']
-                    model_annot = str(first_row['Model Annotation'])
-                    human_annot = str(first_row['Human Annotation'])
-                    current_display = f"**Current Disagreement:** 1 of {len(disagreements_df)}"
-                else:
-                    disagreement_text = "No disagreements found"
-                    model_annot = ""
-                    human_annot = ""
-                    current_display = "**Current Disagreement:** 0 of 0"
-
-                if attr_type == 'freetext':
-                    try:
-                        # BERTScore calculation
-                        scorer = BERTScorer(
-                            model_type="bert-base-uncased",
-                            num_layers=None
-                        )
-                        
-                        # Calculate BERTScore
-                        P, R, F1 = scorer.score(y_pred.tolist(), y_true.tolist())
-                        
-                        # Calculate mean scores
-                        mean_bert_p = P.mean().item()
-                        mean_bert_r = R.mean().item()
-                        mean_bert_f1 = F1.mean().item()
-
-                        # Calculate ROUGE scores
-                        scorer = rouge_scorer.RougeScorer(['rouge1', 'rouge2', 'rougeL'], use_stemmer=True)
-                        
-                        # Calculate ROUGE scores and store in lists for plotting
-                        rouge_scores = {'rouge1': {'p': [], 'r': [], 'f': []},
-                                      'rouge2': {'p': [], 'r': [], 'f': []},
-                                      'rougeL': {'p': [], 'r': [], 'f': []}}
-                        
-                        for ref, pred in zip(y_true, y_pred):
-                            scores = scorer.score(ref, pred)
-                            for metric in ['rouge1', 'rouge2', 'rougeL']:
-                                rouge_scores[metric]['p'].append(scores[metric].precision)
-                                rouge_scores[metric]['r'].append(scores[metric].recall)
-                                rouge_scores[metric]['f'].append(scores[metric].fmeasure)
-                        
-                        # Calculate averages
-                        avg_scores = {metric: {
-                            'p': sum(values['p'])/len(values['p']),
-                            'r': sum(values['r'])/len(values['r']),
-                            'f': sum(values['f'])/len(values['f'])
-                        } for metric, values in rouge_scores.items()}
-                        
-                        # Create visualization
-                        plt.close('all')
-                        plt.style.use('dark_background')
-                        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
-                        
-                        # Plot 1: BERTScore distributions
-                        sns.kdeplot(data=P, label='Precision', ax=ax1, color='blue')
-                        sns.kdeplot(data=R, label='Recall', ax=ax1, color='green')
-                        sns.kdeplot(data=F1, label='F1', ax=ax1, color='red')
-                        ax1.axvline(mean_bert_p, color='blue', linestyle='--', alpha=0.5)
-                        ax1.axvline(mean_bert_r, color='green', linestyle='--', alpha=0.5)
-                        ax1.axvline(mean_bert_f1, color='red', linestyle='--', alpha=0.5)
-                        ax1.set_title('BERTScore Distribution', color='white', pad=20)
-                        ax1.set_xlabel('Score', color='white')
-                        ax1.set_ylabel('Density', color='white')
-                        ax1.tick_params(colors='white')
-                        ax1.legend()
-
-                        # Plot 2: ROUGE F1 distributions
-                        sns.kdeplot(data=rouge_scores['rouge1']['f'], label='ROUGE-1', ax=ax2, color='blue')
-                        sns.kdeplot(data=rouge_scores['rouge2']['f'], label='ROUGE-2', ax=ax2, color='green')
-                        sns.kdeplot(data=rouge_scores['rougeL']['f'], label='ROUGE-L', ax=ax2, color='red')
-                        ax2.set_title('ROUGE Score Distribution', color='white', pad=20)
-                        ax2.set_xlabel('F1 Score', color='white')
-                        ax2.set_ylabel('Density', color='white')
-                        ax2.tick_params(colors='white')
-                        ax2.legend()
-
-                        plt.tight_layout()
-                        
-                        # Create metrics text
-                        metrics = [
-                            f"[b][u]BERTScore Metrics[/u][/b]",
-                            f"Precision: {mean_bert_p:.3f}",
-                            f"Recall: {mean_bert_r:.3f}",
-                            f"F1: {mean_bert_f1:.3f}",
-                            f"",
-                            f"[b][u]ROUGE-1 Metrics[/u][/b]",
-                            f"Precision: {avg_scores['rouge1']['p']:.3f}",
-                            f"Recall: {avg_scores['rouge1']['r']:.3f}",
-                            f"F1: {avg_scores['rouge1']['f']:.3f}",
-                            f"",
-                            f"[b][u]ROUGE-2 Metrics[/u][/b]",
-                            f"Precision: {avg_scores['rouge2']['p']:.3f}",
-                            f"Recall: {avg_scores['rouge2']['r']:.3f}",
-                            f"F1: {avg_scores['rouge2']['f']:.3f}",
-                            f"",
-                            f"[b][u]ROUGE-L Metrics[/u][/b]",
-                            f"Precision: {avg_scores['rougeL']['p']:.3f}",
-                            f"Recall: {avg_scores['rougeL']['r']:.3f}",
-                            f"F1: {avg_scores['rougeL']['f']:.3f}",
-                            f"",
-                            f"[b][u]Samples Compared[/u][/b]: {len(y_true)}",
-                        ]
-                        
-                        metrics_text = "<br>".join(metrics)
-                        return (
-                            metrics_text, 
-                            fig, 
-                            gr.Slider(**slider_props),
-                            current_display,
-                            disagreement_text,
-                            model_annot,
-                            human_annot
-                        )
-                        
-                    except Exception as e:
-                        print(f"Error calculating text similarity metrics: {e}")
-                        return f"Error calculating text similarity metrics: {str(e)}", None, None, None, "", "", ""
-                
-                else:
-                    # Original categorical metrics and confusion matrix code
-                    metrics = [
-                        f"[b][u]Agreement Rate[/u][/b]: {(y_true == y_pred).mean():.3f}",
-                        f"[b][u]Accuracy[/u][/b]: {accuracy_score(y_true, y_pred):.3f}",
-                        f"[b][u]Macro F1[/u][/b]: {f1_score(y_true, y_pred, average='macro'):.3f}",
-                        f"[b][u]Weighted F1[/u][/b]: {f1_score(y_true, y_pred, average='weighted'):.3f}",
-                        f"[b][u]Samples Compared[/u][/b]: {len(y_true)}"
-                    ]
-
-                    metrics_text = "<br><br>".join(metrics)
-                    
-                    plt.close('all')
-                    plt.style.use('dark_background')
-                    
-                    fig, ax = plt.subplots(figsize=(8, 6))
-                    labels = sorted(list(set(y_true) | set(y_pred)))
-                    cm = confusion_matrix(y_true, y_pred, labels=labels)
-                    
-                    sns.heatmap(
-                        cm, 
-                        annot=True, 
-                        fmt='d',
-                        cmap=sns.dark_palette("#69d", as_cmap=True),
-                        xticklabels=labels,
-                        yticklabels=labels,
-                        ax=ax,
-                        cbar_kws={'label': 'Count'},
-                        annot_kws={'color': 'white', 'fontsize': 10}
-                    )
-                    
-                    plt.title(f'Confusion Matrix - {category}', color='white', pad=20)
-                    plt.ylabel('Human annotation', color='white')
-                    plt.xlabel('Model annotation', color='white')
-                    ax.tick_params(colors='white')
-                    plt.tight_layout()
-                    
-                    return (
-                        metrics_text, 
-                        fig, 
-                        gr.Slider(**slider_props),
-                        current_display,
-                        disagreement_text,
-                        model_annot,
-                        human_annot
+        def compute_statistics(category, codebook):
+            """
+            Computes metrics, the figure and the disagreements for a category. Runs on the
+            analysis pool; the result is cached until the compared columns or the codebook change.
+            """
+            auto_col, user_col = codebook.columns_for(category)
+            if annotator.df is None or auto_col not in annotator.df.columns or user_col not in annotator.df.columns:
+                return {"message": "No comparison data available for this category"}
+
+            df, _ = annotator.read_columns(['text', auto_col, user_col])
+
+            # Get only rows where both auto and user annotations exist
+            y_true, y_pred = comparison_pairs(df, auto_col, user_col)
+            if len(y_true) == 0:
+                return {"message": "No matching annotations found for comparison"}
+
+            # Get the attribute type and category icons from codebook
+            attr_type = codebook.attribute_type(category)
+            category_icons = codebook.category_icons.get(category, {})
+
+            if attr_type == 'freetext':
+                # BERTScore with the shared model; only pairs not scored before are computed
+                P, R, F1 = bert_scorer.score(y_pred.tolist(), y_true.tolist())
+                rouge = rouge_scores(y_true, y_pred)
+                avg_scores = {metric: {key: values[key].mean() for key in ('p', 'r', 'f')}
+                              for metric, values in rouge.items()}
+
+                metrics = [f"[b][u]BERTScore Metrics[/u][/b]",
+                           f"Precision: {P.mean():.3f}",
+                           f"Recall: {R.mean():.3f}",
+                           f"F1: {F1.mean():.3f}",
+                           f""]
+                for metric, title in (('rouge1', 'ROUGE-1'), ('rouge2', 'ROUGE-2'), ('rougeL', 'ROUGE-L')):
+                    metrics += [f"[b][u]{title} Metrics[/u][/b]",
+                                f"Precision: {avg_scores[metric]['p']:.3f}",
+                                f"Recall: {avg_scores[metric]['r']:.3f}",
+                                f"F1: {avg_scores[metric]['f']:.3f}",
+                                f""]
+                metrics.append(f"[b][u]Samples Compared[/u][/b]: {len(y_true)}")
+                metrics_text = "<br>".join(metrics)
+
+                fig = distribution_figure((P, R, F1), rouge)
+                positions = np.flatnonzero(y_true.to_numpy() != y_pred.to_numpy())
+                icons = None
+            else:
+                agreement = categorical_agreement(y_true, y_pred)
+                metrics = [
+                    f"[b][u]Agreement Rate[/u][/b]: {agreement['accuracy']:.3f}",
+                    f"[b][u]Accuracy[/u][/b]: {agreement['accuracy']:.3f}",
+                    f"[b][u]Cohen's Kappa[/u][/b]: {agreement['kappa']:.3f}",
+                    f"[b][u]Macro F1[/u][/b]: {agreement['macro_f1']:.3f}",
+                    f"[b][u]Weighted F1[/u][/b]: {agreement['weighted_f1']:.3f}",
+                    f"[b][u]Samples Compared[/u][/b]: {agreement['samples']}",
+                    "[b][u]Per-class Precision / Recall / F1[/u][/b]<br>" + "<br>".join(
+                        f"{category_icons.get(label, '')} {label}: {p:.3f} / {r:.3f} / {f:.3f} (n={n})"
+                        for label, p, r, f, n in zip(agreement['labels'], agreement['precision'],
+                                                     agreement['recall'], agreement['f1'], agreement['support'])
                     )
-                    
+                ]
+                metrics_text = "<br><br>".join(metrics)
+
+                fig = confusion_figure(agreement['confusion'], agreement['labels'], category)
+                positions = agreement['disagreements']
+                icons = category_icons
+
+            # Create disagreements table
+            disagreements_df = pd.DataFrame()
+            if len(positions) > 0:
+                disagreements_df = disagreement_table(df, y_true, y_pred, positions, icons)
+
+            return {
+                "metrics": metrics_text,
+                # Encoded once here, so showing a cached result does not redraw the figure
+                "plot": PlotData(type="matplotlib", plot=encode_plot_to_base64(fig)),
+                "disagreements": disagreements_df
+            }
+
+        def statistics_outputs(result):
+            """Turns a compute_statistics result into the tab's outputs"""
+            if "message" in result:
+                return result["message"], None, None, None, "", "", "", pd.DataFrame()
+
+            disagreements_df = result["disagreements"]
+            if len(disagreements_df) > 0:
+                first_row = disagreements_df.iloc[0]
+                disagreement_text = first_row['Text']
+                model_annot = str(first_row['Model Annotation'])
+                human_annot = str(first_row['Human Annotation'])
+                current_display = f"**Current Disagreement:** 1 of {len(disagreements_df)}"
+            else:
+                disagreement_text = "No disagreements found"
+                model_annot = ""
+                human_annot = ""
+                current_display = "**Current Disagreement:** 0 of 0"
+
+            return (
+                result["metrics"],
+                result["plot"],
+                gr.Slider(maximum=max(len(disagreements_df) - 1, 0), value=0),
+                current_display,
+                disagreement_text,
+                model_annot,
+                human_annot,
+                # Disagreements are kept in the session state for navigation
+                disagreements_df
+            )
+
+        async def update_session_statistics(category):
+            """Runs the analysis on the worker pool, showing a computing state until it is done"""
+            if not category:
+                yield "Please select a category", None, None, None, "", "", "", pd.DataFrame()
+                return
+            if annotator.df is None:
+                yield "No comparison data available for this category", None, None, None, "", "", "", pd.DataFrame()
+                return
+
+            # The codebook object is part of the key, so editing the codebook recomputes the analysis
+            codebook = annotator.get_codebook()
+            key = (category, annotator.data_version(['text', *codebook.columns_for(category)]), codebook)
+            future = analysis_cache.get_or_submit(key, lambda: compute_statistics(category, codebook), analysis_pool)
+            if not future.done():
+                yield ("Computing statistics…", None, gr.update(), "**Current Disagreement:** -",
+                       "", "", "", gr.update())
+            try:
+                result = await asyncio.wrap_future(future)
             except Exception as e:
                 print(f"Error in update_statistics: {str(e)}")
-                return f"Error calculating statistics: {str(e)}", None, None, None, "", "", ""
+                yield f"Error calculating statistics: {str(e)}", None, None, None, "", "", "", pd.DataFrame()
+                return
+            yield statistics_outputs(result)
 
         def refresh_status_categories():
             """Updates the category dropdown in the Status tab"""
@@ -314,18 +299,18 @@ def create_status_tab(annotator, demo=None):
                 print(f"Error refreshing status categories: {e}")
                 return gr.Dropdown(choices=[])
 
-        def navigate_disagreement(index):
+        def navigate_disagreement(index, disagreements):
             """Navigate through disagreements using slider"""
             try:
-                if not hasattr(annotator, 'current_disagreements') or annotator.current_disagreements.empty:
+                if disagreements is None or disagreements.empty:
                     return "No disagreements to display", "", "", "**Current Disagreement:** 0 of 0"
                 
-                row = annotator.current_disagreements.iloc[int(index)]
+                row = disagreements.iloc[int(index)]
                 return (
                     row['Text'],
                     str(row['Model Annotation']),
                     str(row['Human Annotation']),
-                    f"**Current Disagreement:** {int(index) + 1} of {len(annotator.current_disagreements)} (Original Index: {row['Original_Index']})"
+                    f"**Current Disagreement:** {int(index) + 1} of {len(disagreements)} (Original Index: {row['Original_Index']})"
                 )
             except Exception as e:
                 print(f"Error navigating disagreements: {e}")
@@ -333,7 +318,7 @@ def create_status_tab(annotator, demo=None):
 
         # Connect event handlers
         refresh_stats_btn.click(
-            fn=update_statistics,
+            fn=update_session_statistics,
             inputs=[category_select],
             outputs=[
                 metrics_display,
@@ -342,7 +327,8 @@ def create_status_tab(annotator, demo=None):
                 disagreement_index_display,
                 disagreement_text,
                 model_annotation,
-                human_annotation
+                human_annotation,
+                disagreements_state
             ]
         )
 
@@ -354,7 +340,7 @@ def create_status_tab(annotator, demo=None):
         # Add new event handler for disagreement navigation
         disagreement_index_slider.change(
             fn=navigate_disagreement,
-            inputs=[disagreement_index_slider],
+            inputs=[disagreement_index_slider, disagreements_state],
             outputs=[
                 disagreement_text,
                 model_annotation,
@@ -0,0 +1,153 @@
+import gradio as gr
+import pandas as pd
+from fannotate.metrics import ResultCache
+from ..utils.display import (
+    ANY_VALUE,
+    EMPTY_VALUE,
+    filterable_columns,
+    page_bounds,
+    process_df_for_display,
+    table_order
+)
+
+PAGE_SIZES = [10, 25, 50, 100]
+
+# Filtered and sorted row order per query and data version, shared by all viewers and sessions
+order_cache = ResultCache(max_entries=64)
+
+def query_page(annotator, reviewed, filter_column, filter_value, sort_by, descending, page, page_size):
+    """
+    Returns (page dataframe, page, number of pages, matching rows). Filtering and sorting
+    are cached until the columns involved change, and only the rows on the page are
+    copied and formatted, so a page costs about the same for any table size.
+    """
+    df = annotator.df
+    if df is None:
+        return pd.DataFrame(), 1, 1, 0
+
+    columns = [column for column in dict.fromkeys(['is_reviewed', filter_column, sort_by])
+               if column in df.columns]
+    query = (reviewed, filter_column, filter_value, sort_by, bool(descending))
+
+    def compute_order():
+        view, _ = annotator.read_columns(columns)
+        return table_order(view, reviewed, filter_column, filter_value, sort_by, descending)
+
+    if columns:
+        order = order_cache.get_or_compute((query, annotator.data_version(columns)), compute_order)
+    else:
+        order = df.index
+
+    page_size = int(page_size)
+    page, pages, start, stop = page_bounds(len(order), page, page_size)
+    rows = annotator.read_rows(order[start:stop])
+    rows.insert(0, 'Index', rows.index)
+    return process_df_for_display(rows, top_n=None, text_length=120), page, pages, len(order)
+
+def filter_values(annotator, column):
+    """Returns the values a column can be filtered on"""
+    if annotator.df is None or column not in annotator.df.columns:
+        return [ANY_VALUE]
+    values = annotator.df[column].dropna().astype(str).unique()
+    return [ANY_VALUE, EMPTY_VALUE] + sorted(values)
+
+def create_table_viewer(annotator, page_size=25):
+    """
+    Creates a paged view of the annotation table with filters and sorting, all done
+    server-side. Returns its components; 'table' can be used for select events.
+    """
+    with gr.Row():
+        reviewed_filter = gr.Radio(
+            label="Reviewed",
+            choices=["All", "Unreviewed", "Reviewed"],
+            value="All",
+            interactive=True
+        )
+        filter_column = gr.Dropdown(label="Filter column", choices=[], interactive=True)
+        filter_value = gr.Dropdown(label="Filter value", choices=[ANY_VALUE], value=ANY_VALUE, interactive=True)
+        sort_by = gr.Dropdown(label="Sort by", choices=[], interactive=True)
+        descending = gr.Checkbox(label="Descending", value=False)
+
+    with gr.Row():
+        prev_btn = gr.Button("◀ Previous", variant="secondary")
+        page_number = gr.Number(label="Page", value=1, precision=0, minimum=1)
+        next_btn = gr.Button("Next ▶", variant="secondary")
+        page_size_select = gr.Dropdown(label="Rows per page", choices=PAGE_SIZES, value=page_size, interactive=True)
+        refresh_btn = gr.Button("🔄 Refresh table", variant="secondary")
+
+    page_info = gr.Markdown("**Page** 1 of 1 (0 rows)")
+    table = gr.DataFrame(interactive=False, wrap=True)
+
+    ############################################################
+    # Event handlers
+    ############################################################
+
+    def show_page(reviewed, column, value, sort_column, desc, page, size):
+        try:
+            page_df, page, pages, total = query_page(annotator, reviewed, column, value, sort_column, desc, page, size)
+            return page_df, page, f"**Page** {page} of {pages} ({total} rows)"
+        except Exception as e:
+            print(f"Error showing table page: {e}")
+            return pd.DataFrame(), 1, f"Error showing table: {str(e)}"
+
+    def refresh_columns(column, sort_column):
+        """Updates the filter and sort choices after the table's columns changed"""
+        columns = filterable_columns(annotator.df)
+        sortable = list(annotator.df.columns) if annotator.df is not None else []
+        return (
+            gr.Dropdown(choices=columns, value=column if column in columns else None),
+            gr.Dropdown(choices=sortable, value=sort_column if sort_column in sortable else None)
+        )
+
+    query_inputs = [reviewed_filter, filter_column, filter_value, sort_by, descending]
+    page_outputs = [table, page_number, page_info]
+
+    # Changing the query starts from the first page
+    for component in [reviewed_filter, filter_value, sort_by, descending, page_size_select]:
+        component.change(
+            fn=lambda reviewed, column, value, sort_column, desc, size:
+                show_page(reviewed, column, value, sort_column, desc, 1, size),
+            inputs=query_inputs + [page_size_select],
+            outputs=page_outputs
+        )
+
+    filter_column.change(
+        fn=lambda column: gr.Dropdown(choices=filter_values(annotator, column), value=ANY_VALUE),
+        inputs=[filter_column],
+        outputs=[filter_value]
+    )
+
+    page_number.submit(
+        fn=show_page,
+        inputs=query_inputs + [page_number, page_size_select],
+        outputs=page_outputs
+    )
+
+    prev_btn.click(
+        fn=lambda *args: show_page(*args[:-2], (args[-2] or 1) - 1, args[-1]),
+        inputs=query_inputs + [page_number, page_size_select],
+        outputs=page_outputs
+    )
+
+    next_btn.click(
+        fn=lambda *args: show_page(*args[:-2], (args[-2] or 1) + 1, args[-1]),
+        inputs=query_inputs + [page_number, page_size_select],
+        outputs=page_outputs
+    )
+
+    refresh_btn.click(
+        fn=refresh_columns,
+        inputs=[filter_column, sort_by],
+        outputs=[filter_column, sort_by]
+    ).then(
+        fn=show_page,
+        inputs=query_inputs + [page_number, page_size_select],
+        outputs=page_outputs
+    )
+
+    return {
+        'table': table,
+        'page_number': page_number,
+        'page_info': page_info,
+        'refresh_btn': refresh_btn
+    }
@@ -1,5 +1,7 @@
 import gradio as gr
 from ..utils.display import process_df_for_display
+from fannotate.ingest import SUPPORTED_EXTENSIONS
+from .table_view import create_table_viewer
 
 def create_upload_tab(annotator):
     """Creates and returns the upload tab interface"""
@@ -12,7 +14,8 @@ def create_upload_tab(annotator):
         
         with gr.Row():
             with gr.Column():
-                file_upload = gr.File(label="Upload Excel File")
+                file_upload = gr.File(label="Upload Data File (Excel, CSV, JSONL or Parquet)",
+                                      file_types=SUPPORTED_EXTENSIONS)
             with gr.Column():
                 sheet_select = gr.Dropdown(label="Select Sheet", choices=[], interactive=True)
                 column_select = gr.Dropdown(label="Select Column", choices=[], interactive=True) 
@@ -26,6 +29,8 @@ def create_upload_tab(annotator):
         with gr.Row():
             preview_df = gr.DataFrame(interactive=False, visible=True,
                                     row_count=(5, "fixed"))
+        with gr.Accordion("Browse annotation table", open=False):
+            create_table_viewer(annotator)
 
         ############################################################
         # Event handlers
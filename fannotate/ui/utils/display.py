@@ -1,35 +1,77 @@
+import numpy as np
 import pandas as pd
 
-def process_df_for_display(df, top_n=5):
+# Filter values in the table viewer that match every row and rows without a value
+ANY_VALUE = "(any)"
+EMPTY_VALUE = "(empty)"
+
+def truncate_text(series, max_length):
+    """Shortens the strings in a series to max_length characters, adding '...' to cut ones"""
+    series = series.astype(str)
+    return series.where(series.str.len() <= max_length, series.str.slice(0, max_length) + '...')
+
+def process_df_for_display(df, top_n=5, text_length=25, max_length=500):
     """
     Purpose: Formats a DataFrame for display in the UI by truncating long text fields for better readability.
+    Only the rows that are shown are formatted.
     """
     if df is None:
         return None
     try:
         if isinstance(df, pd.DataFrame):
-            df_display = df.copy()
+            df_display = df.head(top_n).copy() if top_n is not None else df.copy()
         else:
             df_display = pd.DataFrame(df.value if hasattr(df, 'category') else df)
+            if top_n is not None:
+                df_display = df_display.head(top_n)
         
         if 'text' in df_display.columns:
-            df_display['text'] = df_display['text'].astype(str).apply(
-                lambda x: x[:25] + '...' if len(x) > 25 else x)
+            df_display['text'] = truncate_text(df_display['text'], text_length)
         
         for column in df_display.columns:
             if column != 'text' and df_display[column].dtype == 'object':
-                df_display[column] = df_display[column].astype(str).apply(
-                    lambda x: x[:500] + '...' if len(x) > 500 else x)
+                df_display[column] = truncate_text(df_display[column], max_length)
         
-        return df_display.head(top_n)
+        return df_display
     except Exception as e:
         print(f"Error processing DataFrame: {e}")
         return None
 
-def clean_column_name(name):
+def filterable_columns(df):
+    """Returns the columns the table viewer can filter on"""
+    if df is None:
+        return []
+    return [column for column in df.columns
+            if column == 'is_reviewed' or column.startswith(('autofill_', 'user_'))]
+
+def table_order(df, reviewed="All", filter_column=None, filter_value=None, sort_by=None, descending=False):
     """
-    Purpose: Sanitizes column names by removing special characters and spaces.
+    Returns the index labels of the rows that pass the filters, in display order.
+    reviewed is "All", "Reviewed" or "Unreviewed". filter_value EMPTY_VALUE matches
+    missing values. Without sort_by, rows keep table order.
     """
-    if isinstance(name, list):
-        name = "".join(name)
-    return name.strip().replace('[','').replace(']','').replace("'", '').replace(" ", '_') 
\ No newline at end of file
+    mask = np.ones(len(df), dtype=bool)
+    if reviewed != "All" and 'is_reviewed' in df.columns:
+        is_reviewed = df['is_reviewed'].fillna(False).astype(bool).to_numpy()
+        mask &= is_reviewed if reviewed == "Reviewed" else ~is_reviewed
+    if filter_column in df.columns and filter_value not in (None, ANY_VALUE):
+        values = df[filter_column]
+        if filter_value == EMPTY_VALUE:
+            mask &= values.isna().to_numpy()
+        else:
+            mask &= (values.astype(str) == str(filter_value)).to_numpy()
+
+    index = df.index[mask]
+    if sort_by in df.columns:
+        # Stable sort, so ties keep table order
+        positions = df[sort_by][mask].reset_index(drop=True).sort_values(
+            ascending=not descending, kind='stable', na_position='last').index
+        index = index[positions]
+    return index
+
+def page_bounds(total, page, page_size):
+    """Returns (page, number of pages, start, stop) with page clamped to the valid range"""
+    pages = max(1, -(-total // page_size))
+    page = min(max(1, int(page)), pages)
+    start = (page - 1) * page_size
+    return page, pages, start, min(start + page_size, total)
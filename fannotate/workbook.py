@@ -0,0 +1,70 @@
+import os
+import threading
+from collections import OrderedDict
+
+from fannotate.ingest import list_tables, read_header, read_text_column
+
+
+class WorkbookCache:
+    """
+    Parse-once cache for the uploaded data file. Sheet names and headers are read
+    without parsing the rows, and each text column is streamed in at most once
+    while the file is unchanged. Entries are keyed by file path, modification
+    time and size, so a re-uploaded file is read again.
+    """
+
+    def __init__(self, max_columns=2):
+        self.max_columns = max_columns  # Text columns kept in memory, least recently used dropped first
+        self._key = None
+        self._sheet_names = None
+        self._columns = {}
+        self._text_columns = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sheet_names(self, path):
+        with self._lock:
+            self._check(path)
+            if self._sheet_names is None:
+                self._sheet_names = list_tables(path)
+            return list(self._sheet_names)
+
+    def columns(self, path, sheet_name):
+        """Returns the header of a sheet without reading its data rows"""
+        with self._lock:
+            self._check(path)
+            if sheet_name not in self._columns:
+                self._columns[sheet_name] = read_header(path, sheet_name)
+            return list(self._columns[sheet_name])
+
+    def read_column(self, path, sheet_name, column, progress=None):
+        """Returns the values of one column, streaming them in on first use"""
+        with self._lock:
+            self._check(path)
+            key = (sheet_name, column)
+            if key in self._text_columns:
+                self._text_columns.move_to_end(key)
+                values = self._text_columns[key]
+                if progress is not None:
+                    progress.add(len(values), 0)
+                return values
+            values = read_text_column(path, sheet_name, column, progress)
+            self._text_columns[key] = values
+            while len(self._text_columns) > self.max_columns:
+                self._text_columns.popitem(last=False)
+            return values
+
+    def clear(self):
+        with self._lock:
+            self._reset(None)
+
+    def _check(self, path):
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        if key != self._key:
+            self._reset(key)
+
+    def _reset(self, key):
+        self._key = key
+        self._sheet_names = None
+        self._columns = {}
+        self._text_columns = OrderedDict()